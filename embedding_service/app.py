@@ -1,22 +1,150 @@
+import json
 import os
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+import numpy as np
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List
 from langchain_huggingface import HuggingFaceEmbeddings
+from shared.batching import MicroBatcher
+from shared.inference import INTRA_OP_THREADS, InferencePool, QueueFullError, configure_torch_threads
+from shared.embedding_cache import EmbeddingCache
+from onnx_backend import OnnxEmbeddings, ensure_onnx_model, find_snapshot
+from shared.bucketing import run_bucketed, token_lengths
 
-app = FastAPI()
+MODEL_ID = "intfloat/multilingual-e5-small"
+
+# Inference backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime, CPU)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "true").lower() == "true"
+
+# Batching knobs: texts from concurrent requests are merged into one forward pass
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_MAX_QUEUE_SIZE = int(os.getenv("EMBED_MAX_QUEUE_SIZE", "4096"))
+# Records embedded together before results are written back on /embed/stream
+EMBED_STREAM_GROUP_SIZE = int(os.getenv("EMBED_STREAM_GROUP_SIZE", "64"))
+
+# Bucketing knobs: each batch is split into forward passes of similar token length
+EMBED_BUCKET_MAX_TOKENS = int(os.getenv("EMBED_BUCKET_MAX_TOKENS", "8192"))
+EMBED_BUCKET_MAX_SIZE = int(os.getenv("EMBED_BUCKET_MAX_SIZE", "64"))
+MAX_SEQ_LENGTH = 512
+
+# Cache knobs: entries kept in memory, and an optional sqlite file for a persistent tier
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "20000"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH") or None
 
 # Set up model cache directory
 cache_dir = os.path.join(os.getcwd(), "model_cache")
 os.makedirs(cache_dir, exist_ok=True)
 
-# Initialize the embedding model
-model = HuggingFaceEmbeddings(
-    model_name="intfloat/multilingual-e5-small",
-    cache_folder=cache_dir,
-    model_kwargs={'trust_remote_code': True}
+model = None
+tokenizer = None
+
+# Vectors from different backends are close but not identical, so they are cached separately
+if EMBEDDING_BACKEND == "onnx":
+    onnx_model_path = ensure_onnx_model(cache_dir, MODEL_ID, quantize=ONNX_QUANTIZE)
+    backend_id = f"{MODEL_ID}:onnx{'-int8' if ONNX_QUANTIZE else ''}"
+else:
+    backend_id = MODEL_ID
+
+def load_model():
+    """
+    Loads the embedding model into this process (the server or a pool worker).
+    """
+    global model, tokenizer
+    # Buckets are sized so that each one runs as a single forward pass
+    if EMBEDDING_BACKEND == "onnx":
+        model = OnnxEmbeddings(
+            onnx_model_path,
+            find_snapshot(cache_dir, MODEL_ID),
+            max_seq_length=MAX_SEQ_LENGTH,
+            batch_size=EMBED_BUCKET_MAX_SIZE,
+            intra_op_threads=INTRA_OP_THREADS
+        )
+        tokenizer = model.tokenizer
+        return
+
+    configure_torch_threads()
+    model = HuggingFaceEmbeddings(
+        model_name=MODEL_ID,
+        cache_folder=cache_dir,
+        model_kwargs={'trust_remote_code': True},
+        encode_kwargs={'batch_size': EMBED_BUCKET_MAX_SIZE}
+    )
+    tokenizer = model._client.tokenizer
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embeds texts in buckets of similar token length, so short chunks are not
+    padded up to the longest chunk of the batch.
+    """
+    lengths = token_lengths(tokenizer, texts, MAX_SEQ_LENGTH)
+    return run_bucketed(model.embed_documents, texts, lengths, EMBED_BUCKET_MAX_TOKENS, EMBED_BUCKET_MAX_SIZE)
+
+pool = InferencePool(initializer=load_model)
+if pool.kind == "thread":
+    load_model()
+
+async def embed_batch(texts: List[str]) -> List[List[float]]:
+    return await pool.run(embed_texts, texts)
+
+batcher = MicroBatcher(
+    embed_batch,
+    max_batch_size=EMBED_MAX_BATCH_SIZE,
+    max_wait_ms=EMBED_MAX_WAIT_MS,
+    max_concurrent_batches=pool.workers,
+    max_queue_size=EMBED_MAX_QUEUE_SIZE,
 )
 
+embedding_cache = None
+if EMBED_CACHE_SIZE or EMBED_CACHE_PATH:
+    embedding_cache = EmbeddingCache(backend_id, max_entries=EMBED_CACHE_SIZE, db_path=EMBED_CACHE_PATH)
+
+async def embed_with_cache(texts: List[str]) -> List[List[float]]:
+    """
+    Serves cached embeddings and sends only the distinct misses to the model.
+    """
+    if embedding_cache is None:
+        return await batcher.submit(texts)
+
+    embeddings = embedding_cache.get_many(texts)
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if missing:
+        computed = dict(zip(missing, await batcher.submit(missing)))
+        embedding_cache.put_many(missing, [computed[text] for text in missing])
+        embeddings = [embedding if embedding is not None else computed[text] for text, embedding in zip(texts, embeddings)]
+    return embeddings
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await batcher.start()
+    yield
+    await batcher.stop()
+    pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+# Every embedding response names the backend that computed it, so clients
+# caching vectors can keep each backend's vectors apart
+BACKEND_HEADER = "X-Embedding-Backend"
+
+# Binary response formats: raw little-endian buffers, shape sent in a header
+BINARY_DTYPES = {
+    "application/x-float32": "<f4",
+    "application/x-float16": "<f2",
+}
+
+def binary_response(embeddings: List[List[float]], media_type: str) -> Response:
+    array = np.asarray(embeddings, dtype=BINARY_DTYPES[media_type])
+    rows, dim = array.shape if array.ndim == 2 else (0, 0)
+    return Response(
+        content=array.tobytes(),
+        media_type=media_type,
+        headers={"X-Embedding-Shape": f"{rows},{dim}", BACKEND_HEADER: backend_id}
+    )
+
 class EmbeddingRequest(BaseModel):
     texts: List[str]
 
@@ -24,9 +152,74 @@ class EmbeddingResponse(BaseModel):
     embeddings: List[List[float]]
 
 @app.post("/embed", response_model=EmbeddingResponse)
-async def embed(request: EmbeddingRequest):
+async def embed(request: EmbeddingRequest, response: Response, accept: str = Header(default="application/json")):
+    response.headers[BACKEND_HEADER] = backend_id
     try:
-        embeddings = model.embed_documents(request.texts)
+        embeddings = await embed_with_cache(request.texts)
+        media_type = next((media_type for media_type in BINARY_DTYPES if media_type in accept), None)
+        if media_type:
+            return binary_response(embeddings, media_type)
         return EmbeddingResponse(embeddings=embeddings)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def read_ndjson(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if buffer.strip():
+        yield json.loads(buffer)
+
+async def embed_records(records: list) -> str:
+    embeddings = await embed_with_cache([record["text"] for record in records])
+    return "".join(
+        json.dumps({"id": record.get("id"), "embedding": embedding}) + "\n"
+        for record, embedding in zip(records, embeddings)
+    )
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streams results while the request body is still being read. Starlette's
+    StreamingResponse otherwise drains `receive` to watch for disconnects,
+    and that listener swallows the request chunks the endpoint has not read yet.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+@app.post("/embed/stream")
+async def embed_stream(request: Request):
+    """
+    Reads newline-delimited {"id", "text"} records and writes back {"id",
+    "embedding"} records as each group is embedded, so neither side has to
+    hold the whole document in memory.
+    """
+    async def results():
+        group = []
+        async for record in read_ndjson(request):
+            group.append(record)
+            if len(group) >= EMBED_STREAM_GROUP_SIZE:
+                yield await embed_records(group)
+                group = []
+        if group:
+            yield await embed_records(group)
+
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson", headers={BACKEND_HEADER: backend_id})
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "batcher": {**batcher.stats.as_dict(), "queue_depth": batcher.queue_depth()},
+        "backend": backend_id,
+        "pool": pool.as_dict(),
+        "cache": embedding_cache.as_dict() if embedding_cache else None,
+    }
@@ -0,0 +1,163 @@
+"""
+Offline checks for the embedding service backends.
+
+    python benchmark.py onnx [--no-quantize] [--min-cosine 0.99]
+
+compares the ONNX Runtime backend against the PyTorch path: it fails when any
+embedding drifts below the cosine threshold and reports per-batch latency.
+
+    PYTHONPATH=.. python benchmark.py bucketing [--chunks 512] [--chunk-size 512]
+
+embeds a synthetic set of Arabic chunks with the length profile produced by
+the web service's splitter, once in arrival order and once in token-length
+buckets, and reports padding efficiency and wall time for both.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+
+MODEL_ID = "intfloat/multilingual-e5-small"
+cache_dir = os.path.join(os.getcwd(), "model_cache")
+
+SAMPLE_TEXTS = [
+    "ما هي عاصمة جمهورية مصر العربية؟",
+    "تقع القاهرة على ضفاف نهر النيل، وهي أكبر مدينة في العالم العربي من حيث عدد السكان.",
+    "نصت المادة الخامسة من القانون على أن يلتزم صاحب العمل بتوفير وسائل السلامة المهنية لجميع العاملين.",
+    "الذكاء الاصطناعي هو فرع من علوم الحاسوب يهتم ببناء أنظمة قادرة على أداء مهام تتطلب ذكاءً بشرياً.",
+    "بلغت إيرادات الشركة في عام 2023 نحو 4.5 مليار ريال بزيادة قدرها 12% عن العام السابق.",
+    "كيف يمكنني تقديم طلب الحصول على تأشيرة الدراسة؟",
+    "The quick brown fox jumps over the lazy dog.",
+    "الحمد لله",
+]
+
+
+def timed(fn, texts, repeats):
+    fn(texts)  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeats):
+        result = fn(texts)
+    return result, 1000 * (time.perf_counter() - started) / repeats
+
+
+def compare_onnx(args) -> int:
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from onnx_backend import OnnxEmbeddings, ensure_onnx_model, find_snapshot
+
+    torch_model = HuggingFaceEmbeddings(model_name=MODEL_ID, cache_folder=cache_dir)
+    onnx_model = OnnxEmbeddings(
+        ensure_onnx_model(cache_dir, MODEL_ID, quantize=args.quantize),
+        find_snapshot(cache_dir, MODEL_ID)
+    )
+
+    texts = (SAMPLE_TEXTS * (args.batch_size // len(SAMPLE_TEXTS) + 1))[:args.batch_size]
+    reference, torch_ms = timed(torch_model.embed_documents, texts, args.repeats)
+    candidate, onnx_ms = timed(onnx_model.embed_documents, texts, args.repeats)
+
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    cosine = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+
+    print(f"backend: onnx{'-int8' if args.quantize else ''}, batch of {len(texts)} texts")
+    print(f"cosine vs torch: min={cosine.min():.5f} mean={cosine.mean():.5f}")
+    print(f"latency per batch: torch={torch_ms:.1f} ms onnx={onnx_ms:.1f} ms speedup={torch_ms / onnx_ms:.2f}x")
+
+    if cosine.min() < args.min_cosine:
+        print(f"FAIL: cosine similarity below {args.min_cosine}")
+        return 1
+    return 0
+
+
+ARABIC_WORDS = (
+    "في من على إلى أن هذا التي الذي كان قد وقد بين عن مع كل الحكومة الشركة القانون "
+    "المادة العمل الدولة السنة المدينة التعليم الطلاب الجامعة الصحة المستشفى الاقتصاد "
+    "السوق الأسعار النفط الطاقة المياه الزراعة التقرير الدراسة البحث النتائج المشروع "
+    "التنمية المجتمع الأسرة الأطفال الثقافة التاريخ العربية مصر السعودية الرياض القاهرة"
+).split()
+
+
+def synthetic_chunks(count: int, chunk_size: int, seed: int = 0) -> list:
+    """
+    Builds chunks the way the splitter cuts paragraphs: long paragraphs yield
+    full-size chunks plus a shorter tail, headings and captions stay short.
+    """
+    rng = random.Random(seed)
+    chunks = []
+    while len(chunks) < count:
+        paragraph_length = int(rng.lognormvariate(5.5, 1.0))
+        words = []
+        while sum(len(word) + 1 for word in words) < paragraph_length:
+            words.append(rng.choice(ARABIC_WORDS))
+        paragraph = " ".join(words)
+        for start in range(0, len(paragraph), chunk_size):
+            chunks.append(paragraph[start:start + chunk_size].strip())
+    return [chunk for chunk in chunks[:count] if chunk]
+
+
+def compare_bucketing(args) -> int:
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from shared.bucketing import padding_stats, run_bucketed, token_budget_batches, token_lengths
+
+    model = HuggingFaceEmbeddings(
+        model_name=MODEL_ID,
+        cache_folder=cache_dir,
+        encode_kwargs={"batch_size": args.batch_size}
+    )
+    tokenizer = model._client.tokenizer
+    texts = synthetic_chunks(args.chunks, args.chunk_size)
+    lengths = token_lengths(tokenizer, texts, 512)
+    print(f"{len(texts)} chunks, tokens per chunk: min={min(lengths)} "
+          f"median={int(np.median(lengths))} max={max(lengths)}")
+
+    arrival_batches = [list(range(start, min(start + args.batch_size, len(texts))))
+                       for start in range(0, len(texts), args.batch_size)]
+    bucketed_batches = token_budget_batches(lengths, args.max_tokens, args.batch_size)
+
+    def arrival_order(batch_texts):
+        # Fixed slices in arrival order, one forward pass each
+        return [vector for start in range(0, len(batch_texts), args.batch_size)
+                for vector in model.embed_documents(batch_texts[start:start + args.batch_size])]
+
+    def bucketed(batch_texts):
+        return run_bucketed(model.embed_documents, batch_texts, lengths, args.max_tokens, args.batch_size)
+
+    _, arrival_ms = timed(arrival_order, texts, args.repeats)
+    _, bucketed_ms = timed(bucketed, texts, args.repeats)
+
+    for name, batches, elapsed in (("arrival", arrival_batches, arrival_ms), ("bucketed", bucketed_batches, bucketed_ms)):
+        stats = padding_stats(lengths, batches)
+        print(f"{name:>9}: {stats['batches']} batches, {stats['padded_tokens']} padded tokens, "
+              f"efficiency={stats['efficiency']:.2f}, {elapsed:.0f} ms")
+    print(f"speedup: {arrival_ms / bucketed_ms:.2f}x")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    onnx_parser = commands.add_parser("onnx", help="parity and latency of the ONNX backend against PyTorch")
+    onnx_parser.add_argument("--no-quantize", dest="quantize", action="store_false")
+    onnx_parser.add_argument("--min-cosine", type=float, default=0.99)
+    onnx_parser.add_argument("--batch-size", type=int, default=32)
+    onnx_parser.add_argument("--repeats", type=int, default=10)
+    onnx_parser.set_defaults(run=compare_onnx)
+
+    bucketing_parser = commands.add_parser("bucketing", help="arrival-order batches against token-length buckets")
+    bucketing_parser.add_argument("--chunks", type=int, default=512)
+    bucketing_parser.add_argument("--chunk-size", type=int, default=512, help="splitter chunk size in characters")
+    bucketing_parser.add_argument("--batch-size", type=int, default=32)
+    bucketing_parser.add_argument("--max-tokens", type=int, default=8192)
+    bucketing_parser.add_argument("--repeats", type=int, default=3)
+    bucketing_parser.set_defaults(run=compare_bucketing)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import logging
+import os
+from typing import List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def find_snapshot(cache_dir: str, model_id: str) -> str:
+    """
+    Returns the directory of the snapshot the Hugging Face cache points to.
+    """
+    repo_dir = os.path.join(cache_dir, "models--" + model_id.replace("/", "--"))
+    with open(os.path.join(repo_dir, "refs", "main")) as f:
+        revision = f.read().strip()
+    return os.path.join(repo_dir, "snapshots", revision)
+
+
+def export_onnx(snapshot_dir: str, output_path: str, opset: int = 17):
+    """
+    Exports the transformer encoder of a sentence-transformers snapshot to ONNX.
+    Pooling and normalization are done in NumPy, so the graph only returns the
+    token embeddings.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    class Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    tokenizer = AutoTokenizer.from_pretrained(snapshot_dir)
+    encoder = Encoder(AutoModel.from_pretrained(snapshot_dir)).eval()
+    sample = tokenizer(["query: مرحبا بالعالم", "passage: نص تجريبي أطول قليلا"], padding=True, return_tensors="pt")
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            (sample["input_ids"], sample["attention_mask"]),
+            output_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+    logger.info(f"Exported ONNX model to {output_path}")
+
+
+def quantize_onnx(input_path: str, output_path: str):
+    """
+    Applies dynamic int8 quantization to the weights of an exported model.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QInt8)
+    logger.info(f"Quantized ONNX model to {output_path}")
+
+
+def ensure_onnx_model(cache_dir: str, model_id: str, quantize: bool = True) -> str:
+    """
+    Returns the path of the ONNX model for `model_id`, exporting (and
+    quantizing) the cached snapshot on first use.
+    """
+    onnx_dir = os.path.join(cache_dir, "onnx", model_id.replace("/", "--"))
+    fp32_path = os.path.join(onnx_dir, "model.onnx")
+    int8_path = os.path.join(onnx_dir, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        export_onnx(find_snapshot(cache_dir, model_id), fp32_path)
+    if quantize and not os.path.exists(int8_path):
+        quantize_onnx(fp32_path, int8_path)
+    return int8_path if quantize else fp32_path
+
+
+class OnnxEmbeddings:
+    """
+    Embeds texts with ONNX Runtime on CPU, reproducing the sentence-transformers
+    pipeline of multilingual-e5-small: mean pooling over real tokens followed by
+    L2 normalization.
+    """
+    def __init__(
+        self,
+        model_path: str,
+        tokenizer_dir: str,
+        max_seq_length: int = 512,
+        batch_size: int = 32,
+        intra_op_threads: Optional[int] = None,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir)
+        self.max_seq_length = max_seq_length
+        self.batch_size = batch_size
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate([
+            self._encode_batch(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ])
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        attention_mask = encoded["attention_mask"].astype(np.int64)
+        hidden = self.session.run(None, {
+            "input_ids": encoded["input_ids"].astype(np.int64),
+            "attention_mask": attention_mask,
+        })[0]
+
+        # Same pooling and normalization as the Pooling and Normalize modules
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
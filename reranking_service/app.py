@@ -1,47 +1,241 @@
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+from shared.inference import InferencePool, QueueFullError, configure_torch_threads
+from shared.bucketing import run_bucketed, token_lengths
+from shared.batching import MicroBatcher
+from cache import ScoreCache, model_revision
 
-app = FastAPI()
+# Batching knobs: pairs from concurrent /rerank calls share forward passes
+RERANK_MAX_BATCH_PAIRS = int(os.getenv("RERANK_MAX_BATCH_PAIRS", "64"))
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+RERANK_MAX_QUEUE_SIZE = int(os.getenv("RERANK_MAX_QUEUE_SIZE", "4096"))
+
+# Bucketing knobs: pairs are scored in forward passes of similar token length
+RERANK_BUCKET_MAX_TOKENS = int(os.getenv("RERANK_BUCKET_MAX_TOKENS", "8192"))
+RERANK_BUCKET_MAX_SIZE = int(os.getenv("RERANK_BUCKET_MAX_SIZE", "32"))
+MAX_SEQ_LENGTH = 512
+
+# Score cache knobs: follow-up questions re-send the same (query, chunk) pairs
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "100000"))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "3600"))
 
 # Set up model cache directory
 cache_dir = os.path.join(os.getcwd(), "model_cache/NAMAA-Space_GATE-Reranker-V1")
 
-# Initialize the reranking model
-model = HuggingFaceCrossEncoder(
-    model_name=cache_dir,
-    model_kwargs={'trust_remote_code': True}
+model = None
+
+def load_model():
+    """
+    Loads the reranking model into this process (the server or a pool worker).
+    """
+    global model
+    configure_torch_threads()
+    model = HuggingFaceCrossEncoder(
+        model_name=cache_dir,
+        model_kwargs={'trust_remote_code': True}
+    )
+
+def predict(pairs: List[tuple]) -> List[float]:
+    # One bucket is one forward pass of the underlying CrossEncoder
+    scores = model.client.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+    return [float(score) for score in scores]
+
+def score_pairs(pairs: List[tuple]) -> List[float]:
+    """
+    Scores (query, document) pairs in buckets of similar token length and
+    returns the scores in input order.
+    """
+    lengths = token_lengths(model.client.tokenizer, pairs, MAX_SEQ_LENGTH)
+    return run_bucketed(predict, pairs, lengths, RERANK_BUCKET_MAX_TOKENS, RERANK_BUCKET_MAX_SIZE)
+
+pool = InferencePool(initializer=load_model)
+if pool.kind == "thread":
+    load_model()
+
+async def score_batch(pairs: List[tuple]) -> List[float]:
+    return await pool.run(score_pairs, pairs)
+
+batcher = MicroBatcher(
+    score_batch,
+    max_batch_size=RERANK_MAX_BATCH_PAIRS,
+    max_wait_ms=RERANK_MAX_WAIT_MS,
+    max_concurrent_batches=pool.workers,
+    max_queue_size=RERANK_MAX_QUEUE_SIZE,
 )
 
+score_cache = None
+if RERANK_CACHE_SIZE:
+    score_cache = ScoreCache(
+        os.getenv("RERANK_MODEL_REVISION") or model_revision(cache_dir),
+        max_entries=RERANK_CACHE_SIZE,
+        ttl_seconds=RERANK_CACHE_TTL
+    )
+
+async def score_with_cache(pairs: List[tuple]) -> List[float]:
+    """
+    Serves cached scores and sends only the distinct uncached pairs to the model.
+    """
+    if score_cache is None:
+        return await batcher.submit(pairs)
+
+    scores = score_cache.get_many(pairs)
+    missing = list(dict.fromkeys(pair for pair, score in zip(pairs, scores) if score is None))
+    if missing:
+        computed = dict(zip(missing, await batcher.submit(missing)))
+        score_cache.put_many(missing, [computed[pair] for pair in missing])
+        scores = [score if score is not None else computed[pair] for pair, score in zip(pairs, scores)]
+    return scores
+
+tokenizer = None
+
+def truncate_documents(documents: List[str], max_tokens: int) -> List[str]:
+    """
+    Cuts each document after its first `max_tokens` tokens, keeping the original text.
+    """
+    global tokenizer
+    if tokenizer is None:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(cache_dir)
+    encoded = tokenizer(
+        documents, add_special_tokens=False, truncation=True, max_length=max_tokens, return_offsets_mapping=True
+    )
+    return [
+        document[:offsets[-1][1]] if offsets else document
+        for document, offsets in zip(documents, encoded["offset_mapping"])
+    ]
+
+def rank_by_score(scores: List[float]) -> List[int]:
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+
+async def within_deadline(coro, deadline: Optional[float]):
+    """
+    Awaits `coro`, returning None instead if the deadline passes first.
+    """
+    if deadline is None:
+        return await coro
+    try:
+        return await asyncio.wait_for(coro, max(0.0, deadline - time.perf_counter()))
+    except asyncio.TimeoutError:
+        return None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await batcher.start()
+    yield
+    await batcher.stop()
+    pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
 class RerankerRequest(BaseModel):
     query: str
     documents: List[str]
-    top_k: int
+    top_k: Optional[int] = None
+    # Optional caller ids, echoed back instead of the document text
+    document_ids: Optional[List[str]] = None
+    return_documents: bool = True
+    return_all_scores: bool = False
+    # Cascade: pre-score documents cut to this many tokens, then fully score
+    # only the `uncertain_window` ranks on either side of the top_k boundary
+    prescore_max_tokens: Optional[int] = None
+    uncertain_window: int = 2
+    # Return the best ranking available once this much time has passed
+    latency_budget_ms: Optional[float] = None
 
 class ScoredDocument(BaseModel):
-    text: str
-    score: float
+    index: int
+    score: Optional[float] = None
+    id: Optional[str] = None
+    text: Optional[str] = None
 
 class RerankerResponse(BaseModel):
     results: List[ScoredDocument]
+    # Scores of every document in request order, when asked for
+    scores: Optional[List[Optional[float]]] = None
+    # How the ranking was produced: full, cascade, prescore or input_order
+    mode: str = "full"
+
+async def rank_documents(request: RerankerRequest) -> tuple:
+    """
+    Scores the request's documents and returns (scores, ranking, mode).
+    Scores from the truncated pre-scoring pass are only compared with each
+    other; the fully scored middle is ordered among itself.
+    """
+    deadline = None
+    if request.latency_budget_ms is not None:
+        deadline = time.perf_counter() + request.latency_budget_ms / 1000
+    documents = request.documents
+
+    if not request.prescore_max_tokens:
+        scores = await within_deadline(score_with_cache([(request.query, doc) for doc in documents]), deadline)
+        if scores is None:
+            # Out of time: keep the caller's (vector search) order
+            return [None] * len(documents), list(range(len(documents))), "input_order"
+        return scores, rank_by_score(scores), "full"
+
+    truncated = truncate_documents(documents, request.prescore_max_tokens)
+    prescores = await within_deadline(score_with_cache([(request.query, doc) for doc in truncated]), deadline)
+    if prescores is None:
+        return [None] * len(documents), list(range(len(documents))), "input_order"
 
-@app.post("/rerank", response_model=RerankerResponse)
+    order = rank_by_score(prescores)
+    boundary = len(documents) if request.top_k is None else request.top_k
+    start = max(0, boundary - request.uncertain_window)
+    end = min(len(documents), boundary + request.uncertain_window)
+    uncertain = order[start:end]
+    if not uncertain:
+        return prescores, order, "prescore"
+
+    full_scores = await within_deadline(
+        score_with_cache([(request.query, documents[i]) for i in uncertain]), deadline
+    )
+    if full_scores is None:
+        return prescores, order, "prescore"
+
+    scores = list(prescores)
+    for i, score in zip(uncertain, full_scores):
+        scores[i] = score
+    middle = sorted(uncertain, key=lambda i: scores[i], reverse=True)
+    return scores, order[:start] + middle + order[end:], "cascade"
+
+@app.post("/rerank", response_model=RerankerResponse, response_model_exclude_none=True)
 async def rerank(request: RerankerRequest):
+    if request.document_ids is not None and len(request.document_ids) != len(request.documents):
+        raise HTTPException(status_code=422, detail="document_ids must have one id per document")
     try:
-        # Get similarity scores for each document
-        scores = model.predict([(request.query, doc) for doc in request.documents])
-        
-        # Create scored documents
-        scored_docs = [
-            ScoredDocument(text=doc, score=float(score))
-            for doc, score in zip(request.documents, scores)
+        # Score the documents and rank their indices, then take top_k
+        scores, ranking, mode = await rank_documents(request)
+        ranking = ranking[:request.top_k]
+        results = [
+            ScoredDocument(
+                index=i,
+                score=scores[i],
+                id=request.document_ids[i] if request.document_ids else None,
+                text=request.documents[i] if request.return_documents else None
+            )
+            for i in ranking
         ]
-        
-        # Sort by score and take top_k
-        sorted_docs = sorted(scored_docs, key=lambda x: x.score, reverse=True)[:request.top_k]
-        
-        return RerankerResponse(results=sorted_docs)
+
+        return RerankerResponse(results=results, scores=scores if request.return_all_scores else None, mode=mode)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "batcher": {**batcher.stats.as_dict(), "queue_depth": batcher.queue_depth()},
+        "pool": pool.as_dict(),
+        "cache": score_cache.as_dict() if score_cache else None,
+    }
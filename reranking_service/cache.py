@@ -0,0 +1,91 @@
+import hashlib
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text before hashing so trivially different copies share a key.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def model_revision(model_dir: str) -> str:
+    """
+    Identifies the model weights on disk, so scores from a replaced model are
+    never served from the cache.
+    """
+    digest = hashlib.sha256()
+    for name in ("config.json", "model.safetensors"):
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{name}:{stat.st_size}:{int(stat.st_mtime)}".encode())
+    return digest.hexdigest()[:16]
+
+
+class ScoreCache:
+    """
+    LRU cache of cross-encoder scores keyed by a hash of the model revision and
+    the normalized (query, document) pair. Entries expire after `ttl_seconds`
+    and at most `max_entries` are kept (roughly 150 bytes each).
+    """
+    def __init__(self, revision: str, max_entries: int = 100000, ttl_seconds: float = 3600):
+        self.revision = revision
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._entries = OrderedDict()
+
+    def key(self, query: str, document: str) -> bytes:
+        return hashlib.sha256(
+            f"{self.revision}\x00{normalize_text(query)}\x00{normalize_text(document)}".encode("utf-8")
+        ).digest()
+
+    def get_many(self, pairs: Sequence[Tuple[str, str]]) -> List[Optional[float]]:
+        """
+        Returns the cached score of each pair, or None for a miss.
+        """
+        now = time.monotonic()
+        scores = []
+        for query, document in pairs:
+            key = self.key(query, document)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < now:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                scores.append(None)
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                scores.append(entry[0])
+        return scores
+
+    def put_many(self, pairs: Sequence[Tuple[str, str]], scores: Sequence[float]):
+        expires_at = time.monotonic() + self.ttl
+        for (query, document), score in zip(pairs, scores):
+            key = self.key(query, document)
+            self._entries[key] = (score, expires_at)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "revision": self.revision,
+        }
@@ -0,0 +1,157 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Sequence
+from shared.inference import QueueFullError
+
+
+@dataclass
+class BatcherStats:
+    """
+    Counters describing how well concurrent requests are being merged.
+    """
+    batches: int = 0
+    items: int = 0
+    largest_batch: int = 0
+    total_queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+    recent_waits: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    def record(self, batch_size: int, waits: List[float]):
+        self.batches += 1
+        self.items += batch_size
+        self.largest_batch = max(self.largest_batch, batch_size)
+        self.total_queue_wait += sum(waits)
+        self.max_queue_wait = max(self.max_queue_wait, max(waits))
+        self.recent_waits.extend(waits)
+
+    def wait_percentile(self, percentile: float) -> float:
+        if not self.recent_waits:
+            return 0.0
+        waits = sorted(self.recent_waits)
+        return waits[min(len(waits) - 1, int(percentile / 100 * len(waits)))]
+
+    def as_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.largest_batch,
+            "avg_queue_wait_ms": 1000 * self.total_queue_wait / self.items if self.items else 0.0,
+            "max_queue_wait_ms": 1000 * self.max_queue_wait,
+            "p95_queue_wait_ms": 1000 * self.wait_percentile(95),
+        }
+
+
+class MicroBatcher:
+    """
+    Gathers items submitted by concurrent requests into shared batches.
+
+    A batch is flushed as soon as it holds `max_batch_size` items or its oldest
+    item has waited `max_wait_ms`, whichever comes first. `process_batch` gets
+    the list of items and must return one result per item, in order. Up to
+    `max_concurrent_batches` batches are processed at once; while they are all
+    busy, new items keep accumulating into the next batch.
+    """
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 1,
+        max_queue_size: int = 0,
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_queue_size = max_queue_size
+        self.stats = BatcherStats()
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._tasks = set()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, items: Sequence[Any]) -> List[Any]:
+        """
+        Enqueues the items and waits until every one of them has been processed.
+        """
+        if self.max_queue_size and self.queue_depth() + len(items) > self.max_queue_size:
+            raise QueueFullError(f"Batching queue is full ({self.max_queue_size} pending items)")
+        loop = asyncio.get_running_loop()
+        enqueued_at = time.perf_counter()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._queue.put_nowait((item, future, enqueued_at))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                # Past the deadline: take what is already queued, but don't wait for more.
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _process(self, batch: list):
+        # Callers that went away (e.g. client disconnect) don't need a result.
+        batch = [entry for entry in batch if not entry[1].done()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        self.stats.record(len(batch), [started - enqueued_at for _, _, enqueued_at in batch])
+
+        try:
+            results = await self.process_batch([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _release(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            batch = await self._collect()
+            task = asyncio.create_task(self._process(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._release)
@@ -0,0 +1,68 @@
+from typing import Any, Callable, List, Sequence
+
+
+def token_lengths(tokenizer, texts: Sequence[Any], max_length: int) -> List[int]:
+    """
+    Returns the number of tokens each input occupies after truncation.
+    Inputs may be strings or (query, document) pairs.
+    """
+    if not texts:
+        return []
+    if isinstance(texts[0], (tuple, list)):
+        encoded = tokenizer([a for a, _ in texts], [b for _, b in texts], truncation=True, max_length=max_length)
+    else:
+        encoded = tokenizer(list(texts), truncation=True, max_length=max_length)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def token_budget_batches(lengths: Sequence[int], max_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Groups input indices into batches of similar length.
+
+    Indices are visited from longest to shortest, and a batch is closed once
+    padding all of its members to the longest one would exceed `max_tokens`,
+    or once it holds `max_batch_size` inputs.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    current = []
+    for i in order:
+        # The first member of a batch is its longest, since lengths are decreasing
+        if current and (lengths[current[0]] * (len(current) + 1) > max_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def run_bucketed(
+    fn: Callable[[List[Any]], Sequence[Any]],
+    items: Sequence[Any],
+    lengths: Sequence[int],
+    max_tokens: int,
+    max_batch_size: int,
+) -> List[Any]:
+    """
+    Calls `fn` once per length bucket and returns the results in input order.
+    """
+    results = [None] * len(items)
+    for batch in token_budget_batches(lengths, max_tokens, max_batch_size):
+        for i, result in zip(batch, fn([items[i] for i in batch])):
+            results[i] = result
+    return results
+
+
+def padding_stats(lengths: Sequence[int], batches: Sequence[Sequence[int]]) -> dict:
+    """
+    Compares the tokens the model actually attends over with the real ones.
+    """
+    real = sum(lengths)
+    padded = sum(max(lengths[i] for i in batch) * len(batch) for batch in batches if batch)
+    return {
+        "batches": len(batches),
+        "real_tokens": real,
+        "padded_tokens": padded,
+        "efficiency": real / padded if padded else 1.0,
+    }
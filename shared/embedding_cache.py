@@ -0,0 +1,111 @@
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text before hashing so trivially different copies share a key.
+    """
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def cache_key(model_id: str, text: str) -> str:
+    return hashlib.sha256(f"{model_id}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache with a bounded in-memory LRU tier and an
+    optional sqlite tier that survives restarts.
+
+    Vectors are stored as float32 arrays, keyed by a hash of the model id and
+    the normalized text, so a cache is never shared between different models.
+    """
+    def __init__(self, model_id: str, max_entries: int = 20000, db_path: Optional[str] = None):
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    def _remember(self, key: str, vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load_from_disk(self, keys: List[str]) -> dict:
+        found = {}
+        # Stay well below sqlite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob)
+        return found
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Returns the cached embedding for each text, or None for a miss.
+        """
+        keys = [cache_key(self.model_id, text) for text in texts]
+        with self._lock:
+            vectors = {}
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+
+            missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+            if missing and self._db:
+                from_disk = self._load_from_disk(missing)
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+                vectors.update(from_disk)
+                self.disk_hits += sum(1 for key in keys if key in from_disk)
+
+            results = [vectors[key].tolist() if key in vectors else None for key in keys]
+            found = sum(1 for result in results if result is not None)
+            self.hits += found
+            self.misses += len(keys) - found
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        entries = [(cache_key(self.model_id, text), array("f", vector)) for text, vector in zip(texts, vectors)]
+        with self._lock:
+            for key, vector in entries:
+                self._remember(key, vector)
+            if self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in entries]
+                )
+                self._db.commit()
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "persistent": self._db is not None,
+        }
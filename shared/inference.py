@@ -0,0 +1,73 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# Pool knobs, shared by every service that runs blocking model inference
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "256"))
+# Workers x intra-op threads should not exceed the number of cores
+INTRA_OP_THREADS = int(os.getenv("INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS))))
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when a job is submitted while the inference queue is already full.
+    """
+
+
+def configure_torch_threads(intra_op_threads: int = INTRA_OP_THREADS):
+    """
+    Pins the number of threads PyTorch uses inside a single operator.
+    """
+    import torch
+    torch.set_num_threads(intra_op_threads)
+
+
+class InferencePool:
+    """
+    Runs blocking inference calls on a bounded thread or process pool so the
+    event loop stays free to accept requests and answer health checks.
+    """
+    def __init__(
+        self,
+        workers: int = INFERENCE_WORKERS,
+        max_pending: int = INFERENCE_MAX_PENDING,
+        kind: str = INFERENCE_EXECUTOR,
+        initializer: Optional[Callable[[], Any]] = None,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        if kind == "process":
+            # Each worker process loads its own copy of the model
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=initializer)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Runs `fn(*args)` on the pool, rejecting the job if the queue is full.
+        """
+        if self.pending >= self.max_pending:
+            raise QueueFullError(f"Inference queue is full ({self.max_pending} pending jobs)")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def as_dict(self) -> dict:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+        }
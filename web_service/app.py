@@ -2,6 +2,7 @@ import asyncio
 import streamlit as st
 from core.document import DocumentProcessor
 from core.retriever import Retriever
+from core.retrieval_cache import RetrievalCache
 from core.chat import ChatManager
 from utils.config import AppConfig
 from utils.ui import UIManager
@@ -27,38 +28,36 @@ async def main():
 
     # Initialize document processor and retriever with session ID
     doc_processor = DocumentProcessor(config, chunk_size, chunk_overlap, session_id)
-    retriever = Retriever(config, use_reranker, vector_top_k, rerank_top_k, session_id)
+    if st.session_state.get("retrieval_cache") is None:
+        st.session_state.retrieval_cache = RetrievalCache(config.RETRIEVAL_CACHE_SIZE)
+    retriever = Retriever(config, use_reranker, vector_top_k, rerank_top_k, session_id, st.session_state.retrieval_cache)
 
     # File upload and processing
-    uploaded_file = ui_manager.display_file_upload_section()
-    if uploaded_file:
-        process_button = st.button("معالجة المستند", type="primary")
+    uploaded_files = ui_manager.display_file_upload_section()
+    if uploaded_files:
+        process_button = st.button("معالجة المستندات", type="primary")
         if process_button:
-            await doc_processor.process_and_store_embeddings(uploaded_file)
+            await doc_processor.process_and_store_embeddings(uploaded_files)
+            st.session_state.retrieval_cache.clear()
 
-            if doc_processor.vectorstore:
-                retriever.init_vectorstore(doc_processor.vectorstore)
-                chat_manager = ChatManager(config, retriever, temperature, max_tokens, ui_manager)
+    documents = st.session_state.documents
+    if documents:
+        doc_processor.keep_alive()
+        selected, removed = ui_manager.display_documents(documents)
+        if removed:
+            doc_processor.remove_document(removed)
+            st.session_state.retrieval_cache.clear()
+            st.rerun()
 
-                # Chat interface and handling
-                ui_manager.display_chat_interface()
-                chat_manager.handle_chat_input()
+        retriever.init_documents(doc_processor.get_vectorstore(), [documents[file_hash] for file_hash in selected])
+        chat_manager = ChatManager(config, retriever, temperature, max_tokens, ui_manager)
+        chat_manager.handle_chat_input()
+        ui_manager.display_chat_interface()
 
-                # Display relevant context if available
-                if st.session_state.chat_history:
-                    ui_manager.display_relevant_context(retriever, st.session_state.chat_history[-1]['content'], use_reranker)
-            else:
-                st.error("Failed to initialize vector store. Please check the logs.")
-        elif 'vectorstore' in st.session_state and st.session_state.vectorstore:
-            # If documents were already processed, show chat interface
-            retriever.init_vectorstore(st.session_state.vectorstore)
-            chat_manager = ChatManager(config, retriever, temperature, max_tokens, ui_manager)
-            chat_manager.handle_chat_input()
-            ui_manager.display_chat_interface()
-
-            if st.session_state.chat_history:
-                ui_manager.display_relevant_context(retriever, st.session_state.chat_history[-1]['content'], use_reranker)
-    else:
+        # Display relevant context if available
+        if st.session_state.chat_history:
+            ui_manager.display_relevant_context(retriever, st.session_state.chat_history[-1], use_reranker)
+    elif not uploaded_files:
         ui_manager.display_info_message()
 
 
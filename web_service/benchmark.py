@@ -0,0 +1,148 @@
+"""
+Offline benchmarks for the web service's ingestion path.
+
+    python benchmark.py rasterize [--pdf scan.pdf | --pages 300] [--workers N]
+
+renders every page of a PDF (a synthetic one by default) with the previous
+sequential save/reopen/convert/re-save loop and with the in-memory process
+pool, and reports wall time and output size for both.
+
+    python benchmark.py ocr [--pages 100] [--concurrency 8] [--failure-rate 0.05]
+
+runs the OCR pipeline against the offline fake provider, once one page at a
+time and once with bounded concurrency, and checks that page order survives.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def synthetic_pdf(path: str, pages: int, seed: int = 0):
+    """
+    Writes a PDF whose pages resemble scans: dense lines of text with some
+    shaded blocks, so rendering and PNG encoding do realistic work.
+    """
+    import fitz
+
+    rng = random.Random(seed)
+    words = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+    with fitz.open() as doc:
+        for _ in range(pages):
+            page = doc.new_page(width=595, height=842)
+            for line in range(45):
+                text = " ".join(rng.choice(words) for _ in range(12))
+                page.insert_text((40, 50 + line * 17), text, fontsize=10)
+            for _ in range(3):
+                x, y = rng.uniform(40, 400), rng.uniform(50, 700)
+                page.draw_rect(fitz.Rect(x, y, x + 150, y + 80), color=(0, 0, 0), fill=(0.85, 0.85, 0.85))
+        doc.save(path)
+
+
+def sequential_rasterize(pdf_path: str, output_folder: str, zoom: float = 2) -> list:
+    """
+    The original loop: render in color, save, reopen with PIL, convert to
+    grayscale, save again and delete the first file.
+    """
+    import fitz
+    from PIL import Image
+
+    paths = []
+    with fitz.open(pdf_path) as doc:
+        mat = fitz.Matrix(zoom, zoom)
+        for i in range(len(doc)):
+            image_path = os.path.join(output_folder, f"page_{i+1}.png")
+            doc.load_page(i).get_pixmap(matrix=mat).save(image_path)
+            compressed_image_path = os.path.join(output_folder, f"compressed_page_{i+1}.png")
+            Image.open(image_path).convert('L').save(compressed_image_path, "PNG", optimize=True, quality=70)
+            os.remove(image_path)
+            paths.append(compressed_image_path)
+    return paths
+
+
+def compare_rasterize(args) -> int:
+    from core.rasterize import rasterize_pdf
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(workdir, "synthetic.pdf")
+            synthetic_pdf(pdf_path, args.pages)
+
+        started = time.perf_counter()
+        paths = sequential_rasterize(pdf_path, workdir, args.zoom)
+        sequential_s = time.perf_counter() - started
+        sequential_bytes = sum(os.path.getsize(path) for path in paths)
+
+        started = time.perf_counter()
+        pages = rasterize_pdf(pdf_path, zoom=args.zoom, workers=args.workers)
+        pooled_s = time.perf_counter() - started
+        pooled_bytes = sum(len(png) for png in pages)
+
+    print(f"{len(pages)} pages at zoom {args.zoom}, {args.workers or os.cpu_count()} workers")
+    print(f"sequential: {sequential_s:.1f} s ({1000 * sequential_s / len(pages):.0f} ms/page), "
+          f"{sequential_bytes / 1e6:.1f} MB of PNG")
+    print(f"    pooled: {pooled_s:.1f} s ({1000 * pooled_s / len(pages):.0f} ms/page), "
+          f"{pooled_bytes / 1e6:.1f} MB of PNG")
+    print(f"speedup: {sequential_s / pooled_s:.2f}x")
+    return 0
+
+
+def compare_ocr(args) -> int:
+    import asyncio
+    from core.ocr import FakeOCRProvider, OCRPipeline
+
+    images = [f"page-{i}".encode() for i in range(args.pages)]
+    elapsed = {}
+    in_order = True
+    for concurrency in (1, args.concurrency):
+        provider = FakeOCRProvider(latency_ms=args.latency_ms, failure_rate=args.failure_rate)
+        pipeline = OCRPipeline(provider, concurrency=concurrency, timeout=args.timeout,
+                               retries=args.retries, backoff=args.backoff)
+        started = time.perf_counter()
+        texts = asyncio.run(pipeline.run(images))
+        elapsed[concurrency] = time.perf_counter() - started
+
+        # The fake derives each page's text from its image, so order is checkable
+        expected = [f"نص الصفحة {hashlib.sha256(image).hexdigest()[:12]}" for image in images]
+        in_order &= all(text in ("", wanted) for text, wanted in zip(texts, expected))
+        stats = pipeline.as_dict()
+        print(f"concurrency {concurrency:>3}: {elapsed[concurrency]:.1f} s "
+              f"({args.pages / elapsed[concurrency]:.1f} pages/s), {provider.calls} calls, "
+              f"{stats['retried_calls']} retries, {stats['failed_pages']} failed pages")
+
+    print(f"page order preserved: {in_order}")
+    print(f"speedup: {elapsed[1] / elapsed[args.concurrency]:.2f}x")
+    return 0 if in_order else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rasterize_parser = commands.add_parser("rasterize", help="sequential page rendering against the process pool")
+    rasterize_parser.add_argument("--pdf", help="PDF to render; a synthetic one is generated when omitted")
+    rasterize_parser.add_argument("--pages", type=int, default=300, help="pages in the synthetic PDF")
+    rasterize_parser.add_argument("--zoom", type=float, default=2)
+    rasterize_parser.add_argument("--workers", type=int, default=None)
+    rasterize_parser.set_defaults(run=compare_rasterize)
+
+    ocr_parser = commands.add_parser("ocr", help="sequential OCR against the concurrent pipeline, offline")
+    ocr_parser.add_argument("--pages", type=int, default=100)
+    ocr_parser.add_argument("--concurrency", type=int, default=8)
+    ocr_parser.add_argument("--latency-ms", type=float, default=800, help="simulated upload + OCR time per page")
+    ocr_parser.add_argument("--failure-rate", type=float, default=0.05)
+    ocr_parser.add_argument("--timeout", type=float, default=5)
+    ocr_parser.add_argument("--retries", type=int, default=2)
+    ocr_parser.add_argument("--backoff", type=float, default=0.2)
+    ocr_parser.set_defaults(run=compare_ocr)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    chunk_ids: List[str]
+    created: float = field(default_factory=time.time)
+
+
+def question_numbers(question: str) -> Tuple[int, ...]:
+    """
+    The numbers a question mentions, in Western or Arabic-Indic digits.
+    """
+    return tuple(int(number) for number in re.findall(r"\d+", question))
+
+
+class _Partition:
+    """
+    Answers for one corpus: L2-normalized question embeddings stacked in a
+    matrix, searched with one matrix-vector product.
+    """
+    def __init__(self, version: Hashable):
+        self.version = version
+        self.vectors: Optional[np.ndarray] = None
+        self.entries: List[CachedAnswer] = []
+        self.last_used: List[float] = []
+
+
+class AnswerCache:
+    """
+    Semantic cache of chat answers, shared by every session.
+
+    Answers are partitioned by corpus; a lookup returns the answer of the
+    most similar cached question when its cosine similarity reaches
+    `threshold` and both questions mention the same numbers: e5 embeddings
+    barely move when only an article or a section number changes, and
+    "المادة 5" must not be answered with "المادة 6". Each partition remembers the corpus version it was filled
+    against and is emptied as soon as it is used with another version, so a
+    reindexed or edited corpus never serves old answers.
+    """
+    def __init__(self, threshold: float = 0.97, max_entries: int = 256, max_corpora: int = 64):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_corpora = max_corpora
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._partitions: "OrderedDict[Hashable, _Partition]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _partition(self, corpus: Hashable, version: Hashable) -> _Partition:
+        partition = self._partitions.get(corpus)
+        if partition is None or partition.version != version:
+            if partition is not None:
+                self.invalidations += 1
+            partition = self._partitions[corpus] = _Partition(version)
+        self._partitions.move_to_end(corpus)
+        while len(self._partitions) > self.max_corpora:
+            self._partitions.popitem(last=False)
+        return partition
+
+    def lookup(self, corpus: Hashable, version: Hashable, question: str,
+               embedding: Sequence[float]) -> Optional[Tuple[CachedAnswer, float]]:
+        """
+        Returns the cached answer closest to the question and its similarity,
+        or None when nothing is close enough.
+        """
+        query = self._normalize(embedding)
+        numbers = question_numbers(question)
+        with self._lock:
+            partition = self._partition(corpus, version)
+            if partition.vectors is not None and len(partition.vectors):
+                sims = partition.vectors @ query
+                for best in np.argsort(-sims):
+                    if sims[best] < self.threshold:
+                        break
+                    if question_numbers(partition.entries[best].question) == numbers:
+                        partition.last_used[best] = time.time()
+                        self.hits += 1
+                        return partition.entries[best], float(sims[best])
+            self.misses += 1
+            return None
+
+    def store(self, corpus: Hashable, version: Hashable, question: str, embedding: Sequence[float], answer: str,
+              chunk_ids: Sequence[str]):
+        """
+        Caches an answer with the ids of the context chunks it was generated from.
+        """
+        vector = self._normalize(embedding)[None, :]
+        with self._lock:
+            partition = self._partition(corpus, version)
+            if partition.vectors is not None and len(partition.entries) >= self.max_entries:
+                # Drop the least recently used answer
+                victim = int(np.argmin(partition.last_used))
+                partition.vectors = np.delete(partition.vectors, victim, axis=0)
+                del partition.entries[victim]
+                del partition.last_used[victim]
+            partition.vectors = vector if partition.vectors is None else np.vstack([partition.vectors, vector])
+            partition.entries.append(CachedAnswer(question, answer, list(chunk_ids)))
+            partition.last_used.append(time.time())
+
+    def invalidate(self, corpus: Hashable):
+        with self._lock:
+            if self._partitions.pop(corpus, None) is not None:
+                self.invalidations += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            entries = sum(len(partition.entries) for partition in self._partitions.values())
+            corpora = len(self._partitions)
+        return {
+            "corpora": corpora,
+            "entries": entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+_shared_cache: Optional[AnswerCache] = None
+_shared_lock = threading.Lock()
+
+def get_shared_answer_cache(config) -> AnswerCache:
+    """
+    Returns the process-wide answer cache, so every session benefits from
+    the answers given to the others.
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = AnswerCache(
+                threshold=config.ANSWER_CACHE_THRESHOLD,
+                max_entries=config.ANSWER_CACHE_SIZE
+            )
+        return _shared_cache
@@ -2,8 +2,15 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
+from operator import itemgetter
 from datetime import datetime
+from typing import Iterator, Optional
+import logging
+import time
 import streamlit as st
+from core.answer_cache import CachedAnswer, get_shared_answer_cache
+
+logger = logging.getLogger(__name__)
 
 class ChatManager:
     """
@@ -36,6 +43,92 @@ class ChatManager:
             {question}
             """
         )
+        self.answer_cache = get_shared_answer_cache(config) if config.ANSWER_CACHE else None
+
+    def answer_cache_partition(self) -> tuple:
+        """
+        Answers depend on the searched documents, on the retrieval settings
+        that pick their context and on the generation settings.
+        """
+        return (
+            self.retriever.corpus_key(),
+            self.retriever.settings_key(),
+            self.model.model_name,
+            self.temperature,
+            self.max_tokens,
+            self.top_p
+        )
+
+    def cached_answer(self, question: str, embedding) -> Optional[CachedAnswer]:
+        """
+        Returns the answer given to a near-identical question against the
+        same corpus version, or None.
+        """
+        if self.answer_cache is None:
+            return None
+        hit = self.answer_cache.lookup(
+            self.answer_cache_partition(), self.retriever.corpus_version(), question, embedding
+        )
+        if hit is None:
+            return None
+        cached, similarity = hit
+        logger.info(f"Answer cache hit ({similarity:.3f}) for a question like: {cached.question}")
+        return cached
+
+    def store_answer(self, question: str, embedding, answer: str, chunk_ids: list, version: tuple):
+        """
+        Caches an answer, unless the corpus changed while it was generated.
+        """
+        if self.answer_cache is None or self.retriever.corpus_version() != version:
+            return
+        self.answer_cache.store(self.answer_cache_partition(), version, question, embedding, answer, chunk_ids)
+
+    def retrieve(self, inputs: dict) -> list:
+        return self.retriever.get_relevant_documents(inputs["question"])
+
+    async def aretrieve(self, inputs: dict) -> list:
+        return await self.retriever.aget_relevant_documents(inputs["question"])
+
+    @staticmethod
+    def format_context(inputs: dict) -> str:
+        return "\n\n".join(doc.page_content for doc in inputs["docs"])
+
+    def build_chain(self):
+        """
+        Retrieves the context documents and generates the answer from them.
+        The chain outputs both, so callers see exactly the context an answer
+        was generated from.
+        """
+        answer = (
+            {"context": RunnableLambda(self.format_context), "question": itemgetter("question")}
+            | self.prompt
+            | self.model
+            | StrOutputParser()
+        )
+        return (
+            RunnablePassthrough.assign(docs=RunnableLambda(self.retrieve, afunc=self.aretrieve))
+            .assign(answer=answer)
+        )
+
+    @staticmethod
+    def stream_answer(chain, question: str, timings: dict, context: list) -> Iterator[str]:
+        """
+        Yields the answer as the model produces it, collecting the retrieved
+        documents into `context` and recording the time to the first token
+        and the total generation time in `timings`. Both are measured from the
+        start of the chain, so they include retrieval.
+        """
+        started = time.perf_counter()
+        for chunk in chain.stream({"question": question}):
+            context.extend(chunk.get("docs", []))
+            token = chunk.get("answer")
+            if not token:
+                continue
+            if "ttft" not in timings:
+                timings["ttft"] = time.perf_counter() - started
+            yield token
+        timings["total"] = time.perf_counter() - started
+        timings.setdefault("ttft", timings["total"])
 
     def handle_chat_input(self):
         """
@@ -52,23 +145,37 @@ class ChatManager:
             # self.ui_manager.display_chat_message(st.session_state.chat_history[-1])
 
             with st.chat_message("assistant"):
-                # stream_handler = self.ui_manager.StreamHandler(st.empty())
-                # self.model.callbacks = [stream_handler]
-                chain = (
-                    {
-                        "context": RunnableLambda(self.retriever.invoke),
-                        "question": RunnablePassthrough()
-                    }
-                    | self.prompt
-                    | self.model
-                    | StrOutputParser()
-                )
-                with st.spinner("جارٍ إنشاء الإجابة..."):
-                    answer = chain.invoke(question)
+                chain = self.build_chain()
+                started = time.perf_counter()
+                version = self.retriever.corpus_version()
+                embedding = self.retriever.vectorstore.embeddings.embed_query(question) if self.answer_cache else None
+                hit = self.cached_answer(question, embedding)
+                cached = hit is not None
+                if cached:
+                    answer, chunk_ids = hit.answer, hit.chunk_ids
+                    timings = {"ttft": time.perf_counter() - started}
+                    timings["total"] = timings["ttft"]
+                    st.caption("⚡ إجابة محفوظة لسؤال مشابه")
+                else:
+                    timings, context = {}, []
+                    # Tokens render as they arrive; the finished answer is shown with the chat history
+                    placeholder = st.empty()
+                    with placeholder.container():
+                        answer = st.write_stream(self.stream_answer(chain, question, timings, context))
+                    placeholder.empty()
+                    chunk_ids = [doc.metadata.get("chunk_id") or doc.id for doc in context]
+                    self.store_answer(question, embedding, answer, chunk_ids, version)
 
+                logger.info(f"Answered in {timings['total']:.2f} s, first token after {timings['ttft']:.2f} s"
+                            f"{' (answer cache)' if cached else ''} from {len(chunk_ids)} chunks")
                 st.session_state.chat_history.append({
                     'role': 'assistant',
                     'content': answer,
-                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'ttft': timings['ttft'],
+                    'generation_time': timings['total'],
+                    'cached': cached,
+                    'context_ids': chunk_ids
                 })
-                st.caption(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
\ No newline at end of file
+                st.caption(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} · "
+                           f"⏱️ أول رمز: {timings['ttft']:.2f} ث · الإجابة كاملة: {timings['total']:.2f} ث")
@@ -0,0 +1,266 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEXING = "indexing"
+READY = "ready"
+
+
+def corpus_namespace(file_hash: str) -> str:
+    return f"corpus-{file_hash}"
+
+
+class CorpusRegistry:
+    """
+    Maps file hashes to indexed corpora shared by every session.
+
+    A session that uploads a file someone already indexed attaches to that
+    corpus instead of ingesting it again. Attachments are kept alive by
+    session heartbeats; a corpus's reference count is the number of sessions
+    seen within `session_ttl`. Corpora nobody references are evicted once
+    unused for `corpus_ttl`, or earlier, least recently used first, when the
+    registry goes over its storage quota.
+
+    A new version of a document (same name, other content) takes over the
+    namespace of the previous version when no other session uses it, so
+    ingestion only embeds the chunks that changed and deletes the stale ones.
+
+    The ingestion filling a corpus sends heartbeats; a corpus still marked as
+    indexing without one for `indexing_timeout` was abandoned by a crash or a
+    restart, and the next upload of the file ingests it again.
+    """
+    def __init__(self, db_path: str, session_ttl: float = 3600, corpus_ttl: float = 86400,
+                 max_bytes: int = 1024 * 1024 * 1024, max_corpora: int = 500, indexing_timeout: float = 300):
+        self.db_path = db_path
+        self.session_ttl = session_ttl
+        self.corpus_ttl = corpus_ttl
+        self.max_bytes = max_bytes
+        self.max_corpora = max_corpora
+        self.indexing_timeout = indexing_timeout
+        self.attached = 0
+        self.created = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS corpora (
+                file_hash TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                document_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                size_bytes INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                heartbeat REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS attachments (
+                session_id TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (session_id, file_hash)
+            );
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(corpora)")}
+        if "heartbeat" not in columns:
+            self._db.execute("ALTER TABLE corpora ADD COLUMN heartbeat REAL NOT NULL DEFAULT 0")
+        self._db.commit()
+
+    def acquire(self, file_hash: str, session_id: str, document_name: str) -> Tuple[str, bool]:
+        """
+        Attaches the session to the corpus of `file_hash`, registering a new
+        one when none exists. Returns the corpus namespace and whether the
+        caller has to ingest the file.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT namespace, status, heartbeat FROM corpora WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+            needs_ingestion = row is None or (row[1] == INDEXING and row[2] < now - self.indexing_timeout)
+            if needs_ingestion:
+                if row is not None:
+                    logger.warning(f"Ingestion of {row[0]} was abandoned. Indexing it again.")
+                # A restarted ingestion keeps the namespace and reuses the chunks already stored
+                namespace = row[0] if row is not None else self._take_over_previous_version(
+                    file_hash, session_id, document_name, now
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO corpora (file_hash, namespace, document_name, status, created, last_used, heartbeat) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (file_hash, namespace, document_name, INDEXING, now, now, now)
+                )
+                self.created += 1
+            else:
+                namespace = row[0]
+                self._db.execute("UPDATE corpora SET last_used = ? WHERE file_hash = ?", (now, file_hash))
+                self.attached += 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO attachments (session_id, file_hash, last_seen) VALUES (?, ?, ?)",
+                (session_id, file_hash, now)
+            )
+        return namespace, needs_ingestion
+
+    def _take_over_previous_version(self, file_hash: str, session_id: str, document_name: str, now: float) -> str:
+        """
+        Returns the namespace of an indexed, otherwise unused version of the
+        same document and drops its record, or a new namespace.
+        """
+        previous = self._db.execute(
+            "SELECT file_hash, namespace FROM corpora WHERE document_name = ? AND file_hash != ? AND status = ? "
+            "AND file_hash NOT IN (SELECT file_hash FROM attachments WHERE session_id != ? AND last_seen >= ?) "
+            "ORDER BY last_used DESC LIMIT 1",
+            (document_name, file_hash, READY, session_id, now - self.session_ttl)
+        ).fetchone()
+        if previous is None:
+            return corpus_namespace(file_hash)
+        self._db.execute("DELETE FROM corpora WHERE file_hash = ?", (previous[0],))
+        self._db.execute("DELETE FROM attachments WHERE file_hash = ?", (previous[0],))
+        logger.info(f"Reindexing {document_name} in place in {previous[1]}.")
+        return previous[1]
+
+    def heartbeat(self, file_hash: str):
+        """
+        Called periodically by the ingestion of a corpus while it runs.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE corpora SET heartbeat = ? WHERE file_hash = ? AND status = ?",
+                (time.time(), file_hash, INDEXING)
+            )
+
+    def mark_ready(self, file_hash: str, chunk_count: int, size_bytes: int):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE corpora SET status = ?, chunk_count = ?, size_bytes = ? WHERE file_hash = ?",
+                (READY, chunk_count, size_bytes, file_hash)
+            )
+
+    def is_ready(self, file_hash: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT status FROM corpora WHERE file_hash = ?", (file_hash,)).fetchone()
+        return row is not None and row[0] == READY
+
+    def forget(self, file_hash: str):
+        """
+        Drops a corpus whose ingestion failed, so the next upload retries it.
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM corpora WHERE file_hash = ?", (file_hash,))
+            self._db.execute("DELETE FROM attachments WHERE file_hash = ?", (file_hash,))
+
+    def touch(self, session_id: str):
+        """
+        Heartbeat: keeps the session's attachments and their corpora alive.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("UPDATE attachments SET last_seen = ? WHERE session_id = ?", (now, session_id))
+            self._db.execute(
+                "UPDATE corpora SET last_used = ? WHERE file_hash IN "
+                "(SELECT file_hash FROM attachments WHERE session_id = ?)",
+                (now, session_id)
+            )
+
+    def release(self, session_id: str, file_hash: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM attachments WHERE session_id = ? AND file_hash = ?", (session_id, file_hash))
+
+    def refcount(self, file_hash: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM attachments WHERE file_hash = ? AND last_seen >= ?",
+                (file_hash, time.time() - self.session_ttl)
+            ).fetchone()[0]
+
+    def collect_garbage(self, delete_namespace: Callable[[str], None]) -> List[str]:
+        """
+        Evicts unreferenced corpora that expired, then unreferenced corpora
+        in LRU order until the registry is within its quotas. Calls
+        `delete_namespace` for each one and returns their namespaces.
+        """
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM attachments WHERE last_seen < ?", (now - self.session_ttl,))
+            unreferenced = self._db.execute(
+                "SELECT file_hash, namespace, size_bytes, last_used FROM corpora "
+                "WHERE file_hash NOT IN (SELECT file_hash FROM attachments) ORDER BY last_used"
+            ).fetchall()
+            total_bytes, total_corpora = self._db.execute(
+                "SELECT COALESCE(SUM(size_bytes), 0), COUNT(*) FROM corpora"
+            ).fetchone()
+
+            victims = []
+            for file_hash, namespace, size_bytes, last_used in unreferenced:
+                over_quota = total_bytes > self.max_bytes or total_corpora > self.max_corpora
+                if last_used >= now - self.corpus_ttl and not over_quota:
+                    continue
+                victims.append((file_hash, namespace))
+                total_bytes -= size_bytes
+                total_corpora -= 1
+
+        evicted = []
+        for file_hash, namespace in victims:
+            try:
+                delete_namespace(namespace)
+            except Exception as e:
+                logger.error(f"Failed to delete namespace {namespace}: {e}")
+                continue
+            self.forget(file_hash)
+            evicted.append(namespace)
+        self.evicted += len(evicted)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} unused corpora: {evicted}")
+        return evicted
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            corpora, total_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM corpora"
+            ).fetchone()
+            sessions = self._db.execute(
+                "SELECT COUNT(DISTINCT session_id) FROM attachments WHERE last_seen >= ?",
+                (time.time() - self.session_ttl,)
+            ).fetchone()[0]
+        return {
+            "corpora": corpora,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_corpora": self.max_corpora,
+            "live_sessions": sessions,
+            "attached": self.attached,
+            "created": self.created,
+            "evicted": self.evicted,
+        }
+
+
+_shared_registries = {}
+_shared_lock = threading.Lock()
+
+def get_corpus_registry(config) -> Optional[CorpusRegistry]:
+    """
+    Returns the process-wide registry, or None when sharing is disabled.
+    """
+    if not config.CORPUS_REGISTRY_PATH:
+        return None
+    with _shared_lock:
+        if config.CORPUS_REGISTRY_PATH not in _shared_registries:
+            _shared_registries[config.CORPUS_REGISTRY_PATH] = CorpusRegistry(
+                config.CORPUS_REGISTRY_PATH,
+                session_ttl=config.CORPUS_SESSION_TTL,
+                corpus_ttl=config.CORPUS_TTL,
+                max_bytes=config.CORPUS_QUOTA_MB * 1024 * 1024,
+                max_corpora=config.CORPUS_MAX_COUNT,
+                indexing_timeout=config.CORPUS_INDEXING_TIMEOUT
+            )
+        return _shared_registries[config.CORPUS_REGISTRY_PATH]
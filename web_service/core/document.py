@@ -1,17 +1,44 @@
 import tempfile
-import os
-import fitz
-from PIL import Image
+from collections import Counter
+from dataclasses import dataclass
+from functools import partial
+from typing import Optional
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_pinecone import PineconeVectorStore
-from langchain_pinecone import PineconeEmbeddings
-from utils.utils import upload_image_to_fileio, extract_text_from_image_url, get_file_hash, generate_session_id
+from utils.utils import get_file_hash, generate_session_id
 import logging
 import streamlit as st
 from core.embeddings import CustomEmbeddings
+from core.embedding_cache import get_shared_cache
+from core.http_client import get_service_client, service_client_options
+from core.vectorstore import create_vectorstore, delete_document_vectors, delete_namespace, fetch_documents
+from core.lexical import BM25Index, drop_shared_index, get_shared_index, register_shared_index
+from core.corpus_registry import get_corpus_registry
+from core.ingestion import IngestionJob, document_key
+from core.ocr import OCRPipeline, create_ocr_provider
+from core.ocr_cache import get_shared_ocr_cache
+from core.text_layer import native_page_texts, text_layer_problem
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class SessionDocument:
+    """
+    One document of a session and where its chunks live. Documents with a
+    corpus of their own have a dedicated namespace; otherwise they share the
+    session namespace and are told apart by the "document" metadata key.
+    """
+    file_hash: str
+    name: str
+    namespace: str
+    lexical_index: BM25Index
+    job: Optional[IngestionJob] = None
+    shared_namespace: bool = False
+
+    @property
+    def document_key(self) -> str:
+        return document_key(self.name)
+
+
 class DocumentProcessor:
     """
     Handles the processing of documents, including chunking and embedding storage.
@@ -25,125 +52,187 @@ class DocumentProcessor:
             add_start_index=True
         )
         self.vectorstore = None
-        self.file_hash = None
+        self.ocr_pipeline = OCRPipeline(
+            create_ocr_provider(config),
+            concurrency=config.OCR_CONCURRENCY,
+            timeout=config.OCR_TIMEOUT,
+            retries=config.OCR_RETRIES,
+            backoff=config.OCR_BACKOFF,
+            cache=get_shared_ocr_cache(
+                config.OCR_CACHE_PATH,
+                max_bytes=config.OCR_CACHE_MAX_MB * 1024 * 1024
+            ) if config.OCR_CACHE_PATH else None
+        )
         self.session_id = session_id or generate_session_id()
         self.namespace = self.session_id
+        self.corpus_registry = get_corpus_registry(config)
 
-    def convert_pdf_to_images(self, pdf_path, output_folder, zoom=2):
+    def classify_pdf_pages(self, pdf_path):
         """
-        Converts each page of a PDF file to a grayscale image and compresses it.
+        Reads each page's native text layer and keeps it when it passes the
+        quality checks. Returns one entry per page: the text, or None when the
+        page has to go through OCR.
         """
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-        
-        images_paths = []
         try:
-            doc = fitz.open(pdf_path)
-            mat = fitz.Matrix(zoom, zoom)
-            
-            for i in range(len(doc)):
-                image_path = os.path.join(output_folder, f"page_{i+1}.png")
-                page = doc.load_page(i)
-                pix = page.get_pixmap(matrix=mat)
-                pix.save(image_path)
-                
-                image = Image.open(image_path).convert('L')
-                compressed_image_path = os.path.join(output_folder, f"compressed_page_{i+1}.png")
-                image.save(compressed_image_path, "PNG", optimize=True, quality=70)
-                os.remove(image_path)
-                
-                images_paths.append(compressed_image_path)
-                logger.info(f"Saved and compressed page {i+1} as image: {compressed_image_path}")
-            
-            doc.close()
-            
+            texts = native_page_texts(pdf_path)
         except Exception as e:
-            logger.error(f"An error occurred while converting PDF to images: {e}")
-        
-        return images_paths
+            logger.error(f"An error occurred while reading the PDF text layer: {e}")
+            return None
+
+        pages = []
+        reasons = Counter()
+        for text in texts:
+            problem = text_layer_problem(
+                text,
+                min_chars=self.config.NATIVE_TEXT_MIN_CHARS,
+                min_arabic_ratio=self.config.NATIVE_TEXT_MIN_ARABIC_RATIO
+            )
+            reasons[problem or "native"] += 1
+            pages.append(None if problem else text)
+        logger.info(f"Text layer check: {dict(reasons)}")
+        return pages
     
-    def extract_text_from_pdf_or_image(self, file_path):
-        """
-        Extracts text from a PDF or an image file using OCR.
-        """
-        with tempfile.TemporaryDirectory() as temp_folder:
-            if file_path.lower().endswith('.pdf'):
-                image_paths = self.convert_pdf_to_images(file_path, temp_folder)
-            else:
-                image_paths = [file_path]
-
-            combined_text = ""
-            for image_path in image_paths:
-                image_url = upload_image_to_fileio(image_path)
-                if image_url:
-                    page_text = extract_text_from_image_url(image_url)
-                    combined_text += page_text + "\n\n"
-                else:
-                    logger.warning(f"Failed to upload or process image: {image_path}")
+    def create_embeddings(self):
+        """
+        Returns the embedding client, backed by the process-wide embedding
+        cache of the backend the embedding service runs.
+        """
+        return CustomEmbeddings(
+            api_url=self.config.EMBEDDING_SERVICE_URL,
+            cache_factory=partial(
+                get_shared_cache,
+                max_entries=self.config.EMBEDDING_CACHE_SIZE,
+                db_path=self.config.EMBEDDING_CACHE_PATH
+            ),
+            response_format=self.config.EMBEDDING_RESPONSE_FORMAT,
+            client=get_service_client(self.config.EMBEDDING_SERVICE_URL, **service_client_options(self.config)),
+            batch_size=self.config.EMBEDDING_REQUEST_BATCH
+        )
 
-                if file_path.lower().endswith('.pdf'):
-                    os.remove(image_path)
-        # No need to manually remove files or the directory when using tempfile.TemporaryDirectory()
-        return combined_text
+    def keep_alive(self):
+        """
+        Marks the session's corpora as in use, so they are not garbage-collected.
+        """
+        if self.corpus_registry is not None:
+            self.corpus_registry.touch(self.session_id)
 
-    async def async_init_vectorstore(self, chunks):
+    def drop_corpus(self, vectorstore, namespace: str):
+        delete_namespace(vectorstore, namespace)
+        drop_shared_index(namespace)
+
+    def finish_ingestion(self, file_hash: str, job: IngestionJob):
         """
-        Asynchronously initializes the Pinecone vector store with session namespace.
+        Records the outcome of a background ingestion in the corpus registry.
+        Runs on the ingestion thread.
         """
-        custom_embeddings = CustomEmbeddings(api_url="http://embedding:8000")
-        vectorstore = PineconeVectorStore(
-            index_name=self.config.PINECONE_INDEX_NAME,
-            embedding=custom_embeddings,
-            namespace=self.namespace,
-            pinecone_api_key=self.config.PINECONE_API_KEY
+        if job.error is not None:
+            self.corpus_registry.forget(file_hash)
+        else:
+            self.corpus_registry.mark_ready(file_hash, job.chunks_total, job.stored_bytes)
+
+    def load_lexical_index(self, namespace: str, file_hash: str) -> BM25Index:
+        """
+        Returns the BM25 index of an existing corpus: the one this process
+        already holds, or one rebuilt from the chunks in the vector store.
+        """
+        lexical_index = get_shared_index(namespace)
+        if lexical_index is None:
+            documents = fetch_documents(self.vectorstore, namespace)
+            lexical_index = BM25Index.from_documents(documents)
+            # A corpus still being indexed elsewhere is rebuilt again by the next session
+            if self.corpus_registry.is_ready(file_hash):
+                register_shared_index(namespace, lexical_index)
+            logger.info(f"Rebuilt the lexical index of {namespace} from {len(documents)} chunks.")
+        return lexical_index
+
+    def get_vectorstore(self):
+        """
+        Returns the session's vector store client; every call on it names the
+        namespace of the document it is about.
+        """
+        if st.session_state.get("vectorstore") is None:
+            st.session_state.vectorstore = create_vectorstore(self.config, self.create_embeddings(), self.namespace)
+        self.vectorstore = st.session_state.vectorstore
+        return self.vectorstore
+
+    def add_document(self, uploaded_file, file_hash: str) -> SessionDocument:
+        """
+        Indexes one file in the background, or attaches to its corpus when
+        another session already indexed it.
+        """
+        namespace, needs_ingestion, shared_namespace = self.session_id, True, True
+        if self.corpus_registry is not None:
+            namespace, needs_ingestion = self.corpus_registry.acquire(file_hash, self.session_id, uploaded_file.name)
+            shared_namespace = False
+
+        if not needs_ingestion:
+            logger.info(f"Attached to the existing corpus {namespace}.")
+            return SessionDocument(file_hash, uploaded_file.name, namespace, self.load_lexical_index(namespace, file_hash))
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=uploaded_file.name) as temp_file:
+            temp_file.write(uploaded_file.getbuffer())
+            temp_file_path = temp_file.name
+
+        lexical_index = BM25Index()
+        if not shared_namespace:
+            register_shared_index(namespace, lexical_index)
+        job = IngestionJob(
+            self,
+            temp_file_path,
+            uploaded_file.type,
+            uploaded_file.name,
+            namespace,
+            self.vectorstore,
+            self.vectorstore.embeddings,
+            lexical_index,
+            queue_size=self.config.INGEST_QUEUE_SIZE,
+            batch_size=self.config.INGEST_BATCH_SIZE,
+            on_done=partial(self.finish_ingestion, file_hash) if self.corpus_registry else None,
+            on_heartbeat=partial(self.corpus_registry.heartbeat, file_hash) if self.corpus_registry else None,
+            heartbeat_interval=self.config.CORPUS_INDEXING_TIMEOUT / 5
         )
-        vectorstore.add_documents(chunks)
-        return vectorstore
-    
-    async def process_and_store_embeddings(self, uploaded_file):
-        """
-        Processes the uploaded file, creates document chunks, and stores embeddings.
-        """
-        current_file_hash = get_file_hash(uploaded_file.getvalue())
-
-        if 'vectorstore' not in st.session_state or self.file_hash != current_file_hash:
-            logger.info("New or changed file detected. Processing and storing embeddings.")
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=uploaded_file.name) as temp_file:
-                temp_file.write(uploaded_file.getbuffer())
-                temp_file_path = temp_file.name
-
-            if uploaded_file.type == "text/plain":
-                string_data = uploaded_file.getvalue().decode("utf-8")
-            else:
-                string_data = self.extract_text_from_pdf_or_image(temp_file_path)
-            
-            os.remove(temp_file_path)
-
-            chunks = self.text_splitter.create_documents([string_data])
-
-            # Display success message and document chunks
-            st.markdown("""
-                <div class="success-box" dir="rtl">
-                    <strong>✅ تم تحميل المستند ومعالجته بنجاح!</strong>
-                </div>
-            """, unsafe_allow_html=True)
-
-            with st.expander("📚 عرض قطع المستند"):
-                for i, chunk in enumerate(chunks):
-                    st.markdown(f"""
-                        <div style="padding: 1rem; background-color: var(--background-color); border-radius: 5px; margin-bottom: 1rem; text-align: right;" dir="rtl">
-                            <strong>🔹 القطعة {i+1}</strong> ({len(chunk.page_content)} حرف)<br>
-                            <div style="margin-top: 0.5rem; padding: 1rem; background-color: #FFFFFF; border-radius: 5px;">
-                                {chunk.page_content}
-                            </div>
-                        </div>
-                    """, unsafe_allow_html=True)
-
-            self.vectorstore = await self.async_init_vectorstore(chunks)
-            st.session_state.vectorstore = self.vectorstore  # Store in session state
-            self.file_hash = current_file_hash
-            logger.info("Embeddings stored in vectorstore.")
+        job.start()
+        logger.info(f"Ingestion of {uploaded_file.name} started in the background.")
+        return SessionDocument(file_hash, uploaded_file.name, namespace, lexical_index, job, shared_namespace)
+
+    def remove_document(self, file_hash: str):
+        """
+        Removes one document from the session. Chunks in the session namespace
+        are deleted by their document metadata; a shared corpus is only
+        released, and garbage-collected once no session uses it.
+        """
+        document = st.session_state.documents.pop(file_hash, None)
+        if document is None:
+            return
+        if document.shared_namespace:
+            delete_document_vectors(self.get_vectorstore(), document.document_key, document.namespace)
         else:
-            logger.info("File has not changed. Using existing vectorstore.")
-            self.vectorstore = st.session_state.vectorstore
\ No newline at end of file
+            self.corpus_registry.release(self.session_id, file_hash)
+        logger.info(f"Removed {document.name} from the session.")
+
+    async def process_and_store_embeddings(self, uploaded_files):
+        """
+        Adds the uploaded files to the session's documents. Only files the
+        session does not hold yet are indexed, each in the background, so the
+        documents can be queried while they are still being processed. A file
+        named like one of the session's documents replaces it.
+        """
+        self.get_vectorstore()
+        documents = st.session_state.documents
+        for uploaded_file in uploaded_files:
+            file_hash = get_file_hash(uploaded_file.getvalue())
+            if file_hash in documents:
+                continue
+
+            previous = next((d for d in documents.values() if d.name == uploaded_file.name), None)
+            if previous is not None:
+                logger.info(f"New version of {uploaded_file.name} detected.")
+                if previous.shared_namespace:
+                    # Same chunk ids: the new ingestion reindexes changed chunks in place
+                    del documents[previous.file_hash]
+                else:
+                    self.remove_document(previous.file_hash)
+            documents[file_hash] = self.add_document(uploaded_file, file_hash)
+
+        if self.corpus_registry is not None:
+            self.corpus_registry.collect_garbage(partial(self.drop_corpus, self.vectorstore))
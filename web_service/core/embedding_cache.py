@@ -0,0 +1,17 @@
+import threading
+from typing import Optional
+from shared.embedding_cache import EmbeddingCache
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+def get_shared_cache(model_id: str, max_entries: int, db_path: Optional[str] = None) -> EmbeddingCache:
+    """
+    Returns a process-wide cache so it outlives Streamlit reruns and sessions.
+    """
+    with _shared_lock:
+        key = (model_id, max_entries, db_path)
+        if key not in _shared_caches:
+            _shared_caches[key] = EmbeddingCache(model_id, max_entries=max_entries, db_path=db_path)
+        return _shared_caches[key]
@@ -1,18 +1,190 @@
-import requests
-from typing import List
+import json
+import logging
+import numpy as np
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 from langchain_core.embeddings import Embeddings
+from shared.embedding_cache import EmbeddingCache
+from core.http_client import ServiceClient, get_service_client, split_batches
+
+logger = logging.getLogger(__name__)
+
+# Response formats understood by the embedding service's /embed endpoint
+MEDIA_TYPES = {
+    "json": "application/json",
+    "float32": "application/x-float32",
+    "float16": "application/x-float16",
+}
+BINARY_DTYPES = {
+    "application/x-float32": "<f4",
+    "application/x-float16": "<f2",
+}
+# Names the inference backend that computed the vectors of a response
+BACKEND_HEADER = "X-Embedding-Backend"
+
+def decode_embeddings(response) -> np.ndarray:
+    """
+    Decodes an /embed response into a (texts, dim) array. Binary payloads are
+    wrapped without copying.
+    """
+    media_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+    if media_type not in BINARY_DTYPES:
+        return np.asarray(response.json()["embeddings"], dtype=np.float32)
+    rows, dim = (int(value) for value in response.headers["X-Embedding-Shape"].split(","))
+    return np.frombuffer(response.content, dtype=BINARY_DTYPES[media_type]).reshape(rows, dim)
 
 class CustomEmbeddings(Embeddings):
-    def __init__(self, api_url: str):
+    """
+    Client for the embedding service. Large inputs are split into requests of
+    at most `batch_size` texts, sent concurrently over the shared connection
+    pool; the async variants do the same without blocking the event loop.
+
+    With a `cache_factory`, vectors are cached per inference backend of the
+    service (torch, ONNX, int8 ONNX vectors differ): the backend is read from
+    /metrics on first use, and every response names the backend that computed
+    it, so a service restarted on another backend switches caches.
+    """
+    def __init__(self, api_url: str, cache: Optional[EmbeddingCache] = None, response_format: str = "float32",
+                 client: Optional[ServiceClient] = None, batch_size: int = 64,
+                 cache_factory: Optional[Callable[[str], EmbeddingCache]] = None):
         self.api_url = api_url
+        self._cache = cache
+        self.cache_factory = cache_factory
+        self.backend_id = cache.model_id if cache is not None else None
+        self.media_type = MEDIA_TYPES[response_format]
+        self.client = client or get_service_client(api_url)
+        self.batch_size = batch_size
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        response = requests.post(
-            f"{self.api_url}/embed",
-            json={"texts": texts}
-        )
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        if self._cache is None and self.cache_factory is not None:
+            try:
+                response = self.client.get("/metrics")
+                response.raise_for_status()
+                self._use_backend(response.json()["backend"])
+            except Exception as e:
+                logger.warning(f"Could not read the embedding backend, not caching for now: {e}")
+        return self._cache
+
+    def _use_backend(self, backend_id: str):
+        if self._cache is not None:
+            logger.warning(f"Embedding backend changed from {self.backend_id} to {backend_id}. Switching caches.")
+        self.backend_id = backend_id
+        self._cache = self.cache_factory(backend_id)
+
+    def _check_backend(self, response):
+        backend_id = response.headers.get(BACKEND_HEADER)
+        if self.cache_factory is not None and backend_id and backend_id != self.backend_id:
+            self._use_backend(backend_id)
+
+    def _post_embed_batch(self, texts: List[str]) -> np.ndarray:
+        response = self.client.post("/embed", json={"texts": texts}, headers={"Accept": self.media_type})
+        response.raise_for_status()
+        self._check_backend(response)
+        return decode_embeddings(response)
+
+    async def _apost_embed_batch(self, texts: List[str]) -> np.ndarray:
+        response = await self.client.apost("/embed", json={"texts": texts}, headers={"Accept": self.media_type})
         response.raise_for_status()
-        return response.json()["embeddings"]
+        self._check_backend(response)
+        return decode_embeddings(response)
+
+    def _post_embed(self, texts: List[str]) -> np.ndarray:
+        return np.concatenate(self.client.map(self._post_embed_batch, split_batches(texts, self.batch_size)))
+
+    async def _apost_embed(self, texts: List[str]) -> np.ndarray:
+        return np.concatenate(await self.client.amap(self._apost_embed_batch, split_batches(texts, self.batch_size)))
+
+    def _split_cached(self, texts: List[str]) -> Tuple[list, List[str]]:
+        embeddings = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        return embeddings, missing
+
+    def _merge_computed(self, texts: List[str], embeddings: list, missing: List[str], computed: np.ndarray) -> np.ndarray:
+        if missing:
+            self.cache.put_many(missing, computed)
+            rows = dict(zip(missing, computed))
+            embeddings = [embedding if embedding is not None else rows[text] for text, embedding in zip(texts, embeddings)]
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds the texts and returns them as a float32 array.
+        """
+        if self.cache is None:
+            return self._post_embed(texts).astype(np.float32, copy=False)
+
+        # Only texts that are not cached yet are sent to the embedding service
+        embeddings, missing = self._split_cached(texts)
+        computed = self._post_embed(missing) if missing else None
+        return self._merge_computed(texts, embeddings, missing, computed)
+
+    async def aembed_documents_array(self, texts: List[str]) -> np.ndarray:
+        if self.cache is None:
+            return (await self._apost_embed(texts)).astype(np.float32, copy=False)
+
+        embeddings, missing = self._split_cached(texts)
+        computed = await self._apost_embed(missing) if missing else None
+        return self._merge_computed(texts, embeddings, missing, computed)
+
+    def _post_embed_stream(self, records: List[Tuple[str, str]]) -> Iterator[Tuple[str, np.ndarray]]:
+        body = (
+            json.dumps({"id": record_id, "text": text}, ensure_ascii=False).encode("utf-8") + b"\n"
+            for record_id, text in records
+        )
+        with self.client.post(
+            "/embed/stream",
+            data=body,
+            headers={"Content-Type": "application/x-ndjson"},
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            self._check_backend(response)
+            for line in response.iter_lines():
+                if line:
+                    record = json.loads(line)
+                    yield record["id"], np.asarray(record["embedding"], dtype=np.float32)
+
+    def stream_embeddings(self, records: Iterable[Tuple[str, str]], window: int = 256) -> Iterator[Tuple[str, np.ndarray]]:
+        """
+        Embeds (id, text) records through the streaming endpoint and yields
+        (id, vector) pairs as they come back. Records are sent in windows of
+        `window`, so memory stays constant however long the input is.
+        """
+        records = iter(records)
+        while True:
+            group = list(islice(records, window))
+            if not group:
+                return
+            if self.cache is None:
+                yield from self._post_embed_stream(group)
+                continue
+
+            cached = self.cache.get_many([text for _, text in group])
+            missing = []
+            for (record_id, text), embedding in zip(group, cached):
+                if embedding is None:
+                    missing.append((record_id, text))
+                else:
+                    yield record_id, np.asarray(embedding, dtype=np.float32)
+            if missing:
+                texts = dict(missing)
+                computed = []
+                for record_id, embedding in self._post_embed_stream(missing):
+                    computed.append((texts[record_id], embedding))
+                    yield record_id, embedding
+                self.cache.put_many([text for text, _ in computed], [embedding for _, embedding in computed])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents_array(texts).tolist()
 
     def embed_query(self, text: str) -> List[float]:
-        return self.embed_documents([text])[0] 
\ No newline at end of file
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return (await self.aembed_documents_array(texts)).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,159 @@
+import asyncio
+import random
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Sequence, TypeVar
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Overload and restart responses from the model services, worth retrying
+RETRY_STATUSES = (502, 503, 504)
+
+
+def split_batches(items: Sequence[T], batch_size: int) -> List[Sequence[T]]:
+    return [items[start:start + batch_size] for start in range(0, len(items), batch_size)] or [items]
+
+
+class ServiceClient:
+    """
+    Shared HTTP client for one of the model services.
+
+    Synchronous calls go through a requests Session whose adapter keeps a
+    pool of connections alive and retries connection errors and 502/503/504
+    responses with backoff; async calls use an httpx client with the same
+    limits and retry policy. Both apply a (connect, read) timeout by default.
+    The service endpoints are idempotent, so POSTs are retried too, but a
+    request that timed out is not: the service is still working on it.
+    Timeouts surface as requests.Timeout on both paths.
+    """
+    def __init__(self, base_url: str, connect_timeout: float = 3.0, read_timeout: float = 30.0,
+                 retries: int = 2, backoff: float = 0.3, pool_size: int = 16, concurrency: int = 4):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.concurrency = concurrency
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            # A read timeout means the service is busy with the request:
+            # retrying it only repeats the work, so only connection errors
+            # and overload statuses are retried
+            max_retries=Retry(
+                total=None,
+                connect=retries,
+                read=False,
+                status=retries,
+                other=0,
+                backoff_factor=backoff,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=None,
+                raise_on_status=False
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="service-client")
+        # httpx connections belong to the event loop that opened them
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def request(self, method: str, path: str, timeout=None, **kwargs) -> requests.Response:
+        if isinstance(timeout, (int, float)):
+            timeout = (self.timeout[0], timeout)
+        try:
+            return self.session.request(method, f"{self.base_url}{path}", timeout=timeout or self.timeout, **kwargs)
+        except requests.ConnectionError as e:
+            # urllib3 wraps timeouts it gave up on in a connection error
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, ReadTimeoutError):
+                raise requests.Timeout(str(e)) from e
+            raise
+
+    def get(self, path: str, timeout=None, **kwargs) -> requests.Response:
+        return self.request("GET", path, timeout=timeout, **kwargs)
+
+    def post(self, path: str, timeout=None, **kwargs) -> requests.Response:
+        return self.request("POST", path, timeout=timeout, **kwargs)
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=self.retries)
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def apost(self, path: str, timeout=None, **kwargs) -> httpx.Response:
+        if isinstance(timeout, (int, float)):
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=self.timeout[0])
+        client = self._async_client()
+        for attempt in range(self.retries + 1):
+            try:
+                response = await client.post(path, **kwargs)
+            except httpx.TimeoutException as e:
+                raise requests.Timeout(str(e)) from e
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return response
+            await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        return response
+
+    def map(self, fn: Callable[[T], R], batches: Sequence[T]) -> List[R]:
+        """
+        Calls `fn` on every batch, up to `concurrency` at a time, and returns
+        the results in batch order.
+        """
+        if len(batches) == 1:
+            return [fn(batches[0])]
+        return list(self._executor.map(fn, batches))
+
+    async def amap(self, fn: Callable[[T], Awaitable[R]], batches: Sequence[T]) -> List[R]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(batch):
+            async with semaphore:
+                return await fn(batch)
+
+        return list(await asyncio.gather(*(bounded(batch) for batch in batches)))
+
+
+def service_client_options(config) -> dict:
+    """
+    Connection settings from AppConfig, shared by the embedding and reranker clients.
+    """
+    return {
+        "connect_timeout": config.HTTP_CONNECT_TIMEOUT,
+        "read_timeout": config.HTTP_READ_TIMEOUT,
+        "retries": config.HTTP_RETRIES,
+        "pool_size": config.HTTP_POOL_SIZE,
+        "concurrency": config.HTTP_CONCURRENCY,
+    }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_service_client(base_url: str, **kwargs: Any) -> ServiceClient:
+    """
+    Returns a process-wide client per service URL, so connections are reused
+    across Streamlit reruns and sessions.
+    """
+    with _clients_lock:
+        key = (base_url, tuple(sorted(kwargs.items())))
+        if key not in _clients:
+            _clients[key] = ServiceClient(base_url, **kwargs)
+        return _clients[key]
@@ -0,0 +1,338 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+import fitz
+import numpy as np
+from langchain_core.documents import Document
+from core.rasterize import MIN_PAGES_PER_WORKER, WORKER_CONTEXT, render_pages
+from shared.embedding_cache import normalize_text
+from core.vectorstore import delete_vectors, flush_vectors, list_vector_ids, update_metadata, upsert_vectors
+
+logger = logging.getLogger(__name__)
+
+DONE = None
+
+
+def document_key(name: str) -> str:
+    """
+    Stable key of a document across versions. It is derived from the file
+    name, not its content, so an edited upload maps onto the same chunk ids.
+    """
+    return hashlib.sha256(name.encode("utf-8")).hexdigest()[:16]
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_id(doc_key: str, digest: str, occurrence: int) -> str:
+    """
+    Builds the id of a chunk; repeated identical chunks are told apart by
+    their occurrence number.
+    """
+    return f"{doc_key}#{digest}" if occurrence == 1 else f"{doc_key}#{digest}:{occurrence}"
+
+
+class IngestionJob:
+    """
+    Runs render → OCR → chunk → embed → upsert as one pipeline on a background
+    thread, so the Streamlit script is free while a document is indexed.
+
+    Stages are connected by bounded queues: pages flow through chunking,
+    embedding and upserting as soon as they finish, and a slow stage pauses
+    the ones before it instead of letting memory grow with the document.
+    Every indexed batch is immediately searchable through the vector store and
+    the lexical index, and the counters below are read by the UI for progress.
+
+    Chunk ids are derived from the document name and the chunk text, so
+    reprocessing a document only embeds and upserts chunks that changed and
+    deletes the ones that disappeared.
+    """
+    def __init__(self, processor, file_path: str, file_type: str, document_name: str, namespace: str, vectorstore,
+                 embeddings, lexical_index, queue_size: int = 16, batch_size: int = 32,
+                 on_done: Optional[Callable[["IngestionJob"], None]] = None,
+                 on_heartbeat: Optional[Callable[[], None]] = None, heartbeat_interval: float = 60):
+        self.processor = processor
+        self.config = processor.config
+        self.file_path = file_path
+        self.file_type = file_type
+        self.document_name = document_name
+        self.document_key = document_key(document_name)
+        self.namespace = namespace
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.lexical_index = lexical_index
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.on_done = on_done
+        self.on_heartbeat = on_heartbeat
+        self.heartbeat_interval = heartbeat_interval
+
+        self.pages_total = 0
+        self.pages_done = 0
+        self.native_pages = 0
+        self.ocr_pages = 0
+        # Counters only: the chunks themselves live in the vector store and the lexical index
+        self.chunks_total = 0
+        self.text_bytes = 0
+        self.chunks_indexed = 0
+        self.chunks_reused = 0
+        self.chunks_deleted = 0
+        self.vector_bytes = 0
+        self._existing_ids = set()
+        self._seen_ids = set()
+        self._occurrences = Counter()
+        self.done = False
+        self.error: Optional[str] = None
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    @property
+    def progress(self) -> float:
+        if self.done:
+            return 1.0
+        # Half for pages read, half for the chunks read so far being indexed
+        pages = self.pages_done / self.pages_total if self.pages_total else 0.0
+        indexed = self.chunks_indexed / self.chunks_total if self.chunks_total else 0.0
+        return pages * (0.5 + 0.5 * indexed)
+
+    @property
+    def stored_bytes(self) -> int:
+        """
+        Approximate storage of the document's chunks: texts plus vectors,
+        reused chunks included.
+        """
+        return self.text_bytes + self.chunks_total * self.vector_bytes
+
+    def start(self):
+        threading.Thread(target=self._run, name="ingestion", daemon=True).start()
+
+    def _run(self):
+        try:
+            asyncio.run(self.run())
+        except Exception as e:
+            logger.exception("Ingestion failed")
+            self.error = str(e)
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+            self.done = True
+            os.remove(self.file_path)
+            logger.info(f"Ingested {self.pages_done} pages ({self.native_pages} from the text layer, "
+                        f"{self.ocr_pages} through OCR) into {self.chunks_indexed} chunks in {self.elapsed:.1f} s; "
+                        f"{self.chunks_reused} chunks were already indexed, {self.chunks_deleted} stale ones deleted")
+            logger.info(f"OCR stats: {self.processor.ocr_pipeline.as_dict()}")
+            if self.embeddings.cache is not None:
+                logger.info(f"Embedding cache stats: {self.embeddings.cache.as_dict()}")
+            if self.on_done is not None:
+                self.on_done(self)
+
+    async def run(self):
+        self._existing_ids = set(await asyncio.to_thread(
+            list_vector_ids, self.vectorstore, f"{self.document_key}#", self.namespace
+        ))
+        pages = asyncio.Queue(maxsize=self.queue_size)
+        chunks = asyncio.Queue(maxsize=self.queue_size * 4)
+        heartbeats = asyncio.create_task(self.send_heartbeats()) if self.on_heartbeat is not None else None
+        try:
+            async with asyncio.TaskGroup() as stages:
+                stages.create_task(self.produce_pages(pages))
+                stages.create_task(self.split_pages(pages, chunks))
+                stages.create_task(self.index_chunks(chunks))
+            await self.delete_stale_chunks()
+        finally:
+            await asyncio.to_thread(flush_vectors, self.vectorstore, self.namespace)
+            if heartbeats is not None:
+                heartbeats.cancel()
+
+    async def send_heartbeats(self):
+        """
+        Tells the corpus registry the ingestion is alive until it is cancelled.
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.on_heartbeat)
+            except Exception as e:
+                logger.warning(f"Ingestion heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def produce_pages(self, pages: asyncio.Queue):
+        """
+        Puts (page number, text) on the queue in page order, so repeated
+        chunks are numbered the same way on every run.
+        """
+        if self.file_type == "text/plain":
+            with open(self.file_path, "rb") as text_file:
+                text = text_file.read().decode("utf-8")
+            self.pages_total = 1
+            self.native_pages = 1
+            await pages.put((0, text))
+        elif self.file_path.lower().endswith(".pdf"):
+            await self.produce_pdf_pages(pages)
+        else:
+            with open(self.file_path, "rb") as image_file:
+                image = image_file.read()
+            self.pages_total = 1
+            self.ocr_pages = 1
+            await pages.put((0, await self.processor.ocr_pipeline.recognize_page(asyncio.Semaphore(1), 1, image)))
+        await pages.put(DONE)
+
+    async def produce_pdf_pages(self, pages: asyncio.Queue):
+        page_texts = None
+        if self.config.USE_NATIVE_TEXT:
+            page_texts = await asyncio.to_thread(self.processor.classify_pdf_pages, self.file_path)
+        if page_texts is None:
+            with fitz.open(self.file_path) as doc:
+                page_texts = [None] * len(doc)
+
+        self.pages_total = len(page_texts)
+        ocr_pages = [i for i, text in enumerate(page_texts) if text is None]
+        self.native_pages = self.pages_total - len(ocr_pages)
+        self.ocr_pages = len(ocr_pages)
+
+        # Pages wait here until every page before them is out. OCR finishes
+        # pages roughly in the order they are rendered, so few wait for long.
+        ready = {page_number: text for page_number, text in enumerate(page_texts) if text is not None}
+        next_page = 0
+        release = asyncio.Lock()
+
+        async def release_ready():
+            nonlocal next_page
+            async with release:
+                while next_page in ready:
+                    await pages.put((next_page, ready.pop(next_page)))
+                    next_page += 1
+
+        await release_ready()
+        if not ocr_pages:
+            return
+
+        images = asyncio.Queue(maxsize=self.queue_size)
+        ocr = self.processor.ocr_pipeline
+        semaphore = asyncio.Semaphore(ocr.concurrency)
+
+        async def recognize():
+            while (item := await images.get()) is not DONE:
+                page_number, image = item
+                ready[page_number] = await ocr.recognize_page(semaphore, page_number + 1, image)
+                await release_ready()
+
+        async with asyncio.TaskGroup() as workers:
+            for _ in range(ocr.concurrency):
+                workers.create_task(recognize())
+            await self.rasterize_pages(ocr_pages, images)
+            for _ in range(ocr.concurrency):
+                await images.put(DONE)
+
+    async def rasterize_pages(self, page_numbers: List[int], images: asyncio.Queue):
+        """
+        Renders pages in short runs, one per worker process at a time, and
+        hands each image to OCR as soon as its run is done.
+        """
+        workers = min(self.config.RENDER_WORKERS or os.cpu_count() or 1,
+                      max(1, len(page_numbers) // MIN_PAGES_PER_WORKER))
+        run_length = max(1, min(MIN_PAGES_PER_WORKER, -(-len(page_numbers) // workers)))
+        runs = [page_numbers[start:start + run_length] for start in range(0, len(page_numbers), run_length)]
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) if workers > 1 else None
+        try:
+            for start in range(0, len(runs), workers):
+                rendered = await asyncio.gather(*(
+                    loop.run_in_executor(executor, render_pages, self.file_path, run, self.config.RENDER_ZOOM)
+                    for run in runs[start:start + workers]
+                ))
+                for run in rendered:
+                    for item in run:
+                        await images.put(item)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    async def split_pages(self, pages: asyncio.Queue, chunks: asyncio.Queue):
+        while (item := await pages.get()) is not DONE:
+            page_number, text = item
+            if text.strip():
+                metadata = {"document": self.document_key, "source": self.document_name, "page": page_number + 1}
+                for chunk in self.processor.text_splitter.create_documents([text], metadatas=[metadata]):
+                    self.chunks_total += 1
+                    self.text_bytes += len(chunk.page_content.encode("utf-8"))
+                    await chunks.put(chunk)
+            self.pages_done += 1
+        await chunks.put(DONE)
+
+    async def index_chunks(self, chunks: asyncio.Queue):
+        """
+        Embeds and upserts whatever chunks are ready, up to `batch_size` at a
+        time, without waiting for a batch to fill up.
+        """
+        finished = False
+        while not finished:
+            batch = [await chunks.get()]
+            while len(batch) < self.batch_size and not chunks.empty():
+                batch.append(chunks.get_nowait())
+            if batch[-1] is DONE:
+                batch.pop()
+                finished = True
+            if batch:
+                await self.index_batch(batch)
+
+    async def index_batch(self, batch: List[Document]):
+        """
+        Gives each chunk its content-addressed id and embeds and upserts only
+        the chunks the namespace does not hold yet. Chunks it already holds
+        only get their page and position refreshed.
+        """
+        new_chunks = []
+        reused_chunks = []
+        for chunk in batch:
+            digest = content_digest(chunk.page_content)
+            self._occurrences[digest] += 1
+            chunk.metadata["chunk_id"] = chunk_id(self.document_key, digest, self._occurrences[digest])
+            self._seen_ids.add(chunk.metadata["chunk_id"])
+            if chunk.metadata["chunk_id"] in self._existing_ids:
+                self.chunks_reused += 1
+                reused_chunks.append(chunk)
+            else:
+                new_chunks.append(chunk)
+
+        if reused_chunks:
+            await asyncio.to_thread(
+                update_metadata,
+                self.vectorstore,
+                [chunk.metadata["chunk_id"] for chunk in reused_chunks],
+                [chunk.metadata for chunk in reused_chunks],
+                self.namespace
+            )
+        if new_chunks:
+            texts = [chunk.page_content for chunk in new_chunks]
+            ids = [chunk.metadata["chunk_id"] for chunk in new_chunks]
+            # Vectors come back over the streaming endpoint, never more than a batch in flight
+            streamed = dict(await asyncio.to_thread(list, self.embeddings.stream_embeddings(zip(ids, texts))))
+            vectors = np.stack([streamed[i] for i in ids])
+            await asyncio.to_thread(
+                upsert_vectors,
+                self.vectorstore,
+                ids=ids,
+                vectors=vectors,
+                texts=texts,
+                metadatas=[chunk.metadata for chunk in new_chunks],
+                namespace=self.namespace
+            )
+            self.vector_bytes = vectors.nbytes // len(texts)
+        self.lexical_index.add_documents(batch)
+        self.chunks_indexed += len(batch)
+
+    async def delete_stale_chunks(self):
+        """
+        Removes the chunks of a previous version of the document that the
+        new version no longer contains.
+        """
+        stale = self._existing_ids - self._seen_ids
+        if stale:
+            await asyncio.to_thread(delete_vectors, self.vectorstore, stale, self.namespace)
+        self.chunks_deleted = len(stale)
@@ -0,0 +1,183 @@
+import math
+import re
+import threading
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+# Harakat, superscript alef and tatweel carry no lexical meaning for retrieval
+DIACRITICS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+CHAR_FOLDS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+    **{chr(0x06f0 + d): str(d) for d in range(10)},  # Extended (Persian) digits
+})
+TOKEN = re.compile(r"\w+")
+
+# Light stemming affixes (after folding, so ة has already become ه)
+PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+SUFFIXES = ("ها", "ان", "ات", "ون", "ين", "يه", "ه", "ي")
+
+
+def normalize_arabic(text: str) -> str:
+    """
+    Strips diacritics and tatweel, folds alef, ya and ta-marbuta variants and
+    maps Arabic digits to ASCII.
+    """
+    return DIACRITICS.sub("", text).translate(CHAR_FOLDS).lower()
+
+
+def light_stem(token: str) -> str:
+    """
+    Light10-style stemmer: removes one common prefix and common suffixes while
+    keeping at least two (prefixes: three) letters of the stem.
+    """
+    if token.isdigit():
+        return token
+    if len(token) > 3 and token.startswith("و"):
+        token = token[1:]
+    for prefix in PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            token = token[len(prefix):]
+            break
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            token = token[:-len(suffix)]
+    return token
+
+
+STOPWORDS = {
+    normalize_arabic(word) for word in (
+        "في من على إلى عن مع هذا هذه ذلك تلك التي الذي الذين كان كانت ما لا لم لن أو ثم "
+        "قد كل بين هو هي هم أن إن و أي حتى بعد قبل عند إذا"
+    ).split()
+}
+
+
+def analyze(text: str) -> List[str]:
+    return [light_stem(token) for token in TOKEN.findall(normalize_arabic(text)) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over document chunks.
+
+    Each term's postings are two parallel compact arrays (uint32 chunk
+    positions, uint16 term frequencies), scored with NumPy at query time.
+    Documents may be added while the index is being searched.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Document] = []
+        self.doc_lengths = array("I")
+        self.vocabulary: Dict[str, int] = {}
+        self.postings_docs: List[array] = []
+        self.postings_tfs: List[array] = []
+        self._length_norm = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def from_documents(cls, documents: Sequence[Document], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        index.add_documents(documents)
+        return index
+
+    def add_documents(self, documents: Sequence[Document]):
+        analyzed = [Counter(analyze(document.page_content)) for document in documents]
+        with self._lock:
+            for document, terms in zip(documents, analyzed):
+                position = len(self.documents)
+                self.documents.append(document)
+                self.doc_lengths.append(sum(terms.values()))
+                for term, tf in terms.items():
+                    term_id = self.vocabulary.get(term)
+                    if term_id is None:
+                        term_id = self.vocabulary[term] = len(self.postings_docs)
+                        self.postings_docs.append(array("I"))
+                        self.postings_tfs.append(array("H"))
+                    self.postings_docs[term_id].append(position)
+                    self.postings_tfs[term_id].append(min(tf, 65535))
+            self._length_norm = None
+
+    def chunks_in_reading_order(self, offset: int = 0, limit: Optional[int] = None) -> List[Document]:
+        """
+        Returns a slice of the indexed chunks ordered by page and position, for display.
+        """
+        with self._lock:
+            ordered = sorted(
+                self.documents,
+                key=lambda document: (document.metadata.get("page", 0), document.metadata.get("start_index", 0))
+            )
+        return ordered[offset:None if limit is None else offset + limit]
+
+    def search_with_scores(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        terms = set(analyze(query))
+        with self._lock:
+            if not self.documents:
+                return []
+            if self._length_norm is None:
+                lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+                self._length_norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+
+            n = len(self.documents)
+            scores = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                term_id = self.vocabulary.get(term)
+                if term_id is None:
+                    continue
+                docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[docs])
+
+            matched = np.flatnonzero(scores)
+            if not len(matched):
+                return []
+            top = matched[np.argsort(-scores[matched])[:k]]
+            return [(self.documents[i], float(scores[i])) for i in top]
+
+    def search(self, query: str, k: int = 10) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query, k)]
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Document]], k: int = 60) -> List[Document]:
+    """
+    Merges ranked lists with reciprocal rank fusion. Chunks are matched by
+    their `chunk_id` metadata, falling back to their text.
+    """
+    scores = defaultdict(float)
+    documents = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = doc.metadata.get("chunk_id") or doc.page_content
+            scores[key] += 1.0 / (k + rank + 1)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+_shared_indexes: Dict[str, BM25Index] = {}
+_shared_indexes_lock = threading.Lock()
+
+def get_shared_index(namespace: str) -> Optional[BM25Index]:
+    """
+    Returns the in-process BM25 index of a corpus, if this process built or
+    loaded one, so sessions attached to the same corpus share it.
+    """
+    with _shared_indexes_lock:
+        return _shared_indexes.get(namespace)
+
+def register_shared_index(namespace: str, index: BM25Index):
+    with _shared_indexes_lock:
+        _shared_indexes[namespace] = index
+
+def drop_shared_index(namespace: str):
+    with _shared_indexes_lock:
+        _shared_indexes.pop(namespace, None)
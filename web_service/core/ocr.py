@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import io
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+from utils.utils import upload_image_to_fileio, extract_text_from_image_url
+from core.ocr_cache import OCRCache
+
+logger = logging.getLogger(__name__)
+
+
+class OCRError(Exception):
+    pass
+
+
+class OCRProvider(ABC):
+    """
+    Turns one page image (PNG bytes) into text. Implementations raise
+    OCRError on provider failures; the pipeline retries any exception.
+    """
+    name = "base"
+
+    @abstractmethod
+    async def recognize(self, image: bytes) -> str:
+        ...
+
+
+class ZylaOCRProvider(OCRProvider):
+    """
+    Uploads the page to Cloudinary and sends its URL to the Zyla OCR API.
+    Both calls are blocking, so they run on a dedicated thread pool sized to
+    the pipeline's concurrency. The pipeline abandons a call that exceeds its
+    timeout without interrupting it, so both requests share the same deadline
+    and a hung call frees its thread instead of starving the retries.
+    """
+    name = "zyla"
+
+    def __init__(self, max_workers: int = 8, timeout: float = 60):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr")
+
+    def _recognize(self, image: bytes) -> str:
+        deadline = time.monotonic() + self.timeout
+        image_url = upload_image_to_fileio(io.BytesIO(image), timeout=self.timeout)
+        if not image_url:
+            raise OCRError("upload failed")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise OCRError("upload used up the time budget")
+        return extract_text_from_image_url(image_url, raise_errors=True, timeout=remaining)
+
+    async def recognize(self, image: bytes) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._recognize, image)
+
+
+class FakeOCRProvider(OCRProvider):
+    """
+    Offline stand-in with the latency profile of upload + OCR. It returns a
+    deterministic text per image and can fail a fraction of calls, so the
+    pipeline's throughput and retries can be measured without network access.
+    """
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 800, jitter_ms: float = 200, failure_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    async def recognize(self, image: bytes) -> str:
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        if self._rng.random() < self.failure_rate:
+            raise OCRError("simulated failure")
+        return f"نص الصفحة {hashlib.sha256(image).hexdigest()[:12]}"
+
+
+_providers = {}
+
+
+def create_ocr_provider(config) -> OCRProvider:
+    """
+    Returns the configured provider, shared across Streamlit reruns so its
+    thread pool is created once per process.
+    """
+    key = (config.OCR_PROVIDER, config.OCR_CONCURRENCY, config.OCR_TIMEOUT)
+    if key not in _providers:
+        if config.OCR_PROVIDER == "fake":
+            _providers[key] = FakeOCRProvider()
+        else:
+            _providers[key] = ZylaOCRProvider(max_workers=config.OCR_CONCURRENCY, timeout=config.OCR_TIMEOUT)
+    return _providers[key]
+
+
+class OCRPipeline:
+    """
+    Runs OCR over many pages concurrently. At most `concurrency` calls are in
+    flight, each is bounded by `timeout` seconds and retried up to `retries`
+    times with exponential backoff. Results keep the input page order; a page
+    that still fails after its retries yields an empty string.
+
+    With a `cache`, pages seen before (in any session) skip the provider.
+    """
+    def __init__(self, provider: OCRProvider, concurrency: int = 8, timeout: float = 60,
+                 retries: int = 2, backoff: float = 1.0, cache: Optional[OCRCache] = None):
+        self.provider = provider
+        self.cache = cache
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pages = 0
+        self.failed_pages = 0
+        self.retried_calls = 0
+
+    async def recognize_page(self, semaphore: asyncio.Semaphore, page_number: int, image: bytes) -> str:
+        self.pages += 1
+        if self.cache is not None:
+            text = self.cache.get(self.provider.name, image)
+            if text is not None:
+                return text
+
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                try:
+                    text = await asyncio.wait_for(self.provider.recognize(image), timeout=self.timeout)
+                except Exception as e:
+                    # Any provider failure costs this page an attempt; cancellation still propagates
+                    error = e
+                else:
+                    if self.cache is not None:
+                        self.cache.put(self.provider.name, image, text)
+                    return text
+            if attempt < self.retries:
+                self.retried_calls += 1
+                # Back off outside the semaphore so other pages keep the slot busy
+                await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        self.failed_pages += 1
+        logger.warning(f"OCR failed for page {page_number} after {self.retries + 1} attempts: {error!r}")
+        return ""
+
+    async def run(self, images: Sequence[bytes]) -> List[str]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+        texts = await asyncio.gather(*(
+            self.recognize_page(semaphore, page_number, image)
+            for page_number, image in enumerate(images, start=1)
+        ))
+        logger.info(f"OCR of {len(images)} pages took {time.perf_counter() - started:.1f} s "
+                    f"with {self.provider.name} (concurrency {self.concurrency})")
+        return list(texts)
+
+    def as_dict(self) -> dict:
+        return {
+            "provider": self.provider.name,
+            "pages": self.pages,
+            "failed_pages": self.failed_pages,
+            "retried_calls": self.retried_calls,
+            "cache": self.cache.as_dict() if self.cache is not None else None,
+        }
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def page_key(provider: str, image: bytes) -> str:
+    return hashlib.sha256(provider.encode("utf-8") + b"\x00" + image).hexdigest()
+
+
+class OCRCache:
+    """
+    Disk-backed cache of OCR text keyed by a hash of the OCR provider and the
+    rendered page image, so unchanged pages of a re-uploaded file are free.
+
+    The text stored is bounded by `max_bytes`; once over, the least recently
+    used pages are evicted.
+    """
+    def __init__(self, db_path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages "
+            "(key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self._db.commit()
+        self._entries, self._bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+
+    def get(self, provider: str, image: bytes) -> Optional[str]:
+        key = page_key(provider, image)
+        with self._lock:
+            row = self._db.execute("SELECT text FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, provider: str, image: bytes, text: str):
+        key = page_key(provider, image)
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, text, size, time.time())
+            )
+            if previous:
+                self._bytes -= previous[0]
+            else:
+                self._entries += 1
+            self._bytes += size
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries > 1:
+            rows = self._db.execute("SELECT key, size FROM pages ORDER BY last_used LIMIT 100").fetchall()
+            for key, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self._bytes -= size
+                self._entries -= 1
+                self.evictions += 1
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+def get_shared_ocr_cache(db_path: str, max_bytes: int) -> OCRCache:
+    """
+    Returns a process-wide cache so it outlives Streamlit reruns and sessions.
+    """
+    with _shared_lock:
+        key = (db_path, max_bytes)
+        if key not in _shared_caches:
+            _shared_caches[key] = OCRCache(db_path, max_bytes=max_bytes)
+        return _shared_caches[key]
@@ -0,0 +1,59 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence, Tuple
+import fitz
+
+logger = logging.getLogger(__name__)
+
+# Below this many pages, starting worker processes costs more than it saves
+MIN_PAGES_PER_WORKER = 8
+
+# The app runs threads (Streamlit, the event loop, HTTP pools) when it renders;
+# forking would copy their locks in whatever state they are, so workers are spawned
+WORKER_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def render_pages(pdf_path: str, page_numbers: Sequence[int], zoom: float) -> List[Tuple[int, bytes]]:
+    """
+    Renders pages straight to grayscale pixmaps and encodes each one to PNG
+    once, without touching the disk. Runs inside a worker process, so the
+    document is opened here rather than passed in.
+    """
+    matrix = fitz.Matrix(zoom, zoom)
+    rendered = []
+    with fitz.open(pdf_path) as doc:
+        for page_number in page_numbers:
+            pix = doc.load_page(page_number).get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+            rendered.append((page_number, pix.tobytes("png")))
+    return rendered
+
+
+def rasterize_pdf(pdf_path: str, zoom: float = 2, workers: int = None,
+                  page_numbers: Sequence[int] = None) -> List[bytes]:
+    """
+    Renders the given pages of a PDF (all of them by default) to grayscale
+    PNG bytes, in the order requested.
+
+    Pages are split into one contiguous run per worker process; each worker
+    opens the document itself, since PyMuPDF objects cannot be shared.
+    """
+    if page_numbers is None:
+        with fitz.open(pdf_path) as doc:
+            page_numbers = range(len(doc))
+    page_numbers = list(page_numbers)
+    page_count = len(page_numbers)
+    workers = min(workers or os.cpu_count() or 1, max(1, page_count // MIN_PAGES_PER_WORKER))
+
+    if workers <= 1:
+        return [png for _, png in render_pages(pdf_path, page_numbers, zoom)]
+
+    step = -(-page_count // workers)
+    runs = [page_numbers[start:start + step] for start in range(0, page_count, step)]
+    pages = {}
+    with ProcessPoolExecutor(max_workers=len(runs), mp_context=WORKER_CONTEXT) as executor:
+        for rendered in executor.map(render_pages, [pdf_path] * len(runs), runs, [zoom] * len(runs)):
+            pages.update(rendered)
+    logger.info(f"Rendered {page_count} pages with {len(runs)} worker processes")
+    return [pages[page_number] for page_number in page_numbers]
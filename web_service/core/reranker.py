@@ -1,27 +1,111 @@
-import requests
-from typing import List
+from typing import List, Optional
 from dataclasses import dataclass
+from core.http_client import ServiceClient, get_service_client, split_batches
 
 @dataclass
 class RankedDocument:
-    text: str
-    score: float
+    index: int
+    score: Optional[float] = None
+    id: Optional[str] = None
+    text: Optional[str] = None
 
 class CustomReranker:
-    def __init__(self, api_url: str):
+    """
+    Client for the reranking service, over the shared connection pool.
+    """
+    def __init__(self, api_url: str, client: Optional[ServiceClient] = None, batch_size: int = 64):
         self.api_url = api_url
+        self.client = client or get_service_client(api_url)
+        self.batch_size = batch_size
 
-    def rerank(self, query: str, documents: List[str], top_k: int) -> List[RankedDocument]:
-        response = requests.post(
-            f"{self.api_url}/rerank",
-            json={
-                "query": query,
-                "documents": documents,
-                "top_k": top_k
-            }
-        )
+    def _post_rerank(self, payload: dict, timeout: Optional[float] = None) -> dict:
+        response = self.client.post("/rerank", json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    async def _apost_rerank(self, payload: dict, timeout: Optional[float] = None) -> dict:
+        response = await self.client.apost("/rerank", json=payload, timeout=timeout)
         response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _rerank_payload(query, documents, top_k, document_ids, return_documents,
+                        prescore_max_tokens, uncertain_window, latency_budget_ms) -> dict:
+        return {
+            "query": query,
+            "documents": documents,
+            "top_k": top_k,
+            "document_ids": document_ids,
+            "return_documents": return_documents,
+            "prescore_max_tokens": prescore_max_tokens,
+            "uncertain_window": uncertain_window,
+            "latency_budget_ms": latency_budget_ms
+        }
+
+    @staticmethod
+    def _budget_timeout(latency_budget_ms: Optional[float]) -> Optional[float]:
+        # Leave the service time to answer with its partial ranking before giving up
+        return None if latency_budget_ms is None else latency_budget_ms / 1000 + 1.0
+
+    def rerank(
+        self,
+        query: str,
+        documents: List[str],
+        top_k: int,
+        document_ids: Optional[List[str]] = None,
+        return_documents: bool = False,
+        prescore_max_tokens: Optional[int] = None,
+        uncertain_window: int = 2,
+        latency_budget_ms: Optional[float] = None
+    ) -> List[RankedDocument]:
+        """
+        Returns the top_k documents as (index, score) pairs, best first. The
+        index points into `documents`, so callers reorder without re-matching text.
+        With `prescore_max_tokens` the service runs its truncated pre-scoring
+        cascade, and with `latency_budget_ms` it answers with the best ranking
+        it has when the budget runs out.
+        """
+        payload = self._rerank_payload(query, documents, top_k, document_ids, return_documents,
+                                       prescore_max_tokens, uncertain_window, latency_budget_ms)
+        data = self._post_rerank(payload, timeout=self._budget_timeout(latency_budget_ms))
         return [
-            RankedDocument(**result) 
-            for result in response.json()["results"]
-        ] 
\ No newline at end of file
+            RankedDocument(**result)
+            for result in data["results"]
+        ]
+
+    async def arerank(
+        self,
+        query: str,
+        documents: List[str],
+        top_k: int,
+        document_ids: Optional[List[str]] = None,
+        return_documents: bool = False,
+        prescore_max_tokens: Optional[int] = None,
+        uncertain_window: int = 2,
+        latency_budget_ms: Optional[float] = None
+    ) -> List[RankedDocument]:
+        payload = self._rerank_payload(query, documents, top_k, document_ids, return_documents,
+                                       prescore_max_tokens, uncertain_window, latency_budget_ms)
+        data = await self._apost_rerank(payload, timeout=self._budget_timeout(latency_budget_ms))
+        return [
+            RankedDocument(**result)
+            for result in data["results"]
+        ]
+
+    def score_all(self, query: str, documents: List[str]) -> List[float]:
+        """
+        Returns the score of every document, in input order. Scores do not
+        depend on the other documents, so large inputs are split into
+        concurrent requests.
+        """
+        def score_batch(batch):
+            return self._post_rerank({
+                "query": query,
+                "documents": list(batch),
+                "top_k": 0,
+                "return_documents": False,
+                "return_all_scores": True
+            })["scores"]
+
+        return [score for scores in self.client.map(score_batch, split_batches(documents, self.batch_size))
+                for score in scores]
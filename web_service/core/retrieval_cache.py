@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+from langchain_core.documents import Document
+
+
+class RetrievalCache:
+    """
+    Per-session LRU memo of retrieval results.
+
+    Keys are built by the retriever from the corpus version, the normalized
+    query and every setting that changes the result, so entries computed
+    before a document was (re)indexed are never served again and simply age
+    out of the LRU.
+    """
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[List[Document]]:
+        with self._lock:
+            documents = self._entries.get(key)
+            if documents is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(documents)
+
+    def put(self, key: Hashable, documents: List[Document]):
+        with self._lock:
+            self._entries[key] = list(documents)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def as_dict(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
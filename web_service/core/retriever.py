@@ -1,9 +1,17 @@
+import asyncio
+from typing import Optional, Sequence
 from langchain_core.documents import Document
-from langchain_pinecone import PineconeVectorStore
+from langchain_core.vectorstores import VectorStore
 from pinecone import Pinecone
+import requests
 from utils.utils import generate_session_id
 import logging
 from core.reranker import CustomReranker
+from core.http_client import get_service_client, service_client_options
+from core.lexical import BM25Index, reciprocal_rank_fusion
+from shared.embedding_cache import normalize_text
+from core.retrieval_cache import RetrievalCache
+from core.vectorstore import fetch_documents_by_ids
 
 logger = logging.getLogger(__name__)
 
@@ -11,62 +19,278 @@ class Retriever:
     """
     Retrieves relevant documents for a query, with optional reranking.
     """
-    def __init__(self, config, use_reranker: bool, vector_top_k: int, rerank_top_k: int, session_id: str = None):
+    def __init__(self, config, use_reranker: bool, vector_top_k: int, rerank_top_k: int, session_id: str = None,
+                 cache: Optional[RetrievalCache] = None):
         self.config = config
         self.use_reranker = use_reranker
         self.vector_top_k = vector_top_k
         self.rerank_top_k = rerank_top_k
         self.vectorstore = None
-        self.pc = Pinecone(api_key=self.config.PINECONE_API_KEY)
-        self.index = self.pc.Index(self.config.PINECONE_INDEX_NAME)
+        self.lexical_index = None
+        self.documents = None
+        self.cache = cache
+        if self.config.VECTOR_STORE == "pinecone":
+            self.pc = Pinecone(api_key=self.config.PINECONE_API_KEY)
+            self.index = self.pc.Index(self.config.PINECONE_INDEX_NAME)
         self.session_id = session_id or generate_session_id()
         self.namespace = self.session_id
         if self.use_reranker:
-            self.reranker = CustomReranker(api_url="http://reranker:8001")
+            self.reranker = CustomReranker(
+                api_url=self.config.RERANKER_SERVICE_URL,
+                client=get_service_client(self.config.RERANKER_SERVICE_URL, **service_client_options(self.config))
+            )
 
-    def init_vectorstore(self, vectorstore: PineconeVectorStore):
+    def init_vectorstore(self, vectorstore: VectorStore, lexical_index: BM25Index = None, namespace: str = None):
         """
-        Initializes the vector store with the session-specific namespace.
+        Initializes the vector store with the namespace of the session's corpus
+        (the session namespace by default), and the BM25 index of the same
+        chunks when hybrid search is enabled.
         """
+        self.namespace = namespace or self.namespace
         self.vectorstore = vectorstore
         self.vectorstore._namespace = self.namespace
+        self.lexical_index = lexical_index
+
+    def init_documents(self, vectorstore: VectorStore, documents: Sequence):
+        """
+        Restricts retrieval to the given session documents, which may live in
+        different namespaces, each with its own BM25 index.
+        """
+        self.vectorstore = vectorstore
+        self.documents = list(documents)
+
+    def search_scopes(self) -> list[tuple[str, Optional[dict]]]:
+        """
+        Returns the (namespace, metadata filter) pairs to search. Documents
+        sharing a namespace are selected by their "document" metadata.
+        """
+        if self.documents is None:
+            return [(self.namespace, None)]
+        namespaces = {}
+        for document in self.documents:
+            namespaces.setdefault(document.namespace, []).append(document)
+        return [
+            (namespace, {"document": {"$in": [d.document_key for d in documents]}}
+             if all(d.shared_namespace for d in documents) else None)
+            for namespace, documents in namespaces.items()
+        ]
+
+    def lexical_indexes(self) -> list[BM25Index]:
+        if self.documents is None:
+            return [self.lexical_index] if self.lexical_index is not None else []
+        return [document.lexical_index for document in self.documents if document.lexical_index is not None]
+
+    @staticmethod
+    def merge_scored(results, k: int) -> list:
+        return sorted(results, key=lambda result: result[1], reverse=True)[:k]
+
+    def vector_search(self, query: str) -> list[tuple[Document, float]]:
+        """
+        Searches every scope with one query embedding. Cosine similarities
+        are comparable across namespaces, so results merge by score.
+        """
+        scopes = self.search_scopes()
+        if not scopes:
+            return []
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        return self.merge_scored([
+            result
+            for namespace, filter in scopes
+            for result in self.vectorstore.similarity_search_by_vector_with_score(
+                embedding, k=self.vector_top_k, filter=filter, namespace=namespace
+            )
+        ], self.vector_top_k)
+
+    async def avector_search(self, query: str) -> list[tuple[Document, float]]:
+        scopes = self.search_scopes()
+        if not scopes:
+            return []
+        embedding = await self.vectorstore.embeddings.aembed_query(query)
+        results = await asyncio.gather(*(
+            asyncio.to_thread(
+                self.vectorstore.similarity_search_by_vector_with_score,
+                embedding, k=self.vector_top_k, filter=filter, namespace=namespace
+            )
+            for namespace, filter in scopes
+        ))
+        return self.merge_scored([result for scope in results for result in scope], self.vector_top_k)
+
+    def corpus_key(self) -> tuple:
+        """
+        Identifies the searched documents, whatever their indexing progress.
+        """
+        if self.documents is None:
+            return ((self.namespace,),)
+        return tuple(sorted((document.namespace, document.file_hash) for document in self.documents))
+
+    def corpus_version(self) -> tuple:
+        """
+        Identifies the searched chunks: which documents, and how many of their
+        chunks are indexed, which grows while a document is being ingested.
+        """
+        if self.documents is None:
+            return ((self.namespace, len(self.lexical_index) if self.lexical_index is not None else None),)
+        return tuple(sorted(
+            (document.namespace, document.file_hash, len(document.lexical_index))
+            for document in self.documents
+        ))
+
+    def settings_key(self) -> tuple:
+        """
+        Every setting that changes which chunks a query retrieves.
+        """
+        config = self.config
+        reranker_settings = (
+            self.rerank_top_k, config.RERANK_CASCADE, config.RERANK_SKIP_MARGIN, config.RERANK_PRESCORE_TOKENS,
+            config.RERANK_UNCERTAIN_WINDOW, config.RERANK_LATENCY_BUDGET_MS
+        ) if self.use_reranker else None
+        return (
+            self.vector_top_k,
+            (config.HYBRID_SEARCH, config.LEXICAL_TOP_K, config.RRF_K),
+            reranker_settings
+        )
+
+    def cache_key(self, query: str) -> tuple:
+        return (self.corpus_version(), normalize_text(query), self.settings_key())
+
+    def get_documents_by_ids(self, chunk_ids: Sequence[str]) -> list[Document]:
+        """
+        Reads back chunks retrieved earlier, in the given order, from the
+        namespaces searched now. Chunks no longer indexed are left out.
+        """
+        if not self.vectorstore or not chunk_ids:
+            return []
+        found = {}
+        for namespace in dict.fromkeys(namespace for namespace, _ in self.search_scopes()):
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+            if not missing:
+                break
+            for doc in fetch_documents_by_ids(self.vectorstore, missing, namespace):
+                found[doc.id] = doc
+        return [found[chunk_id] for chunk_id in chunk_ids if chunk_id in found]
 
     def get_relevant_documents(self, query: str) -> list[Document]:
         """
-        Retrieves relevant documents for a query from the session namespace.
+        Retrieves relevant documents for a query from the session's documents.
+        Results are memoized per session, so repeating a query is free.
         """
         if not self.vectorstore:
             logger.error("Vector store not initialized.")
             return []
 
-        vector_results = self.vectorstore.similarity_search(
-            query, 
-            k=self.vector_top_k,
-            namespace=self.namespace
-        )
+        key = self.cache_key(query) if self.cache is not None else None
+        if key is not None and (cached := self.cache.get(key)) is not None:
+            return cached
+        results, complete = self.retrieve(query)
+        if key is not None and complete:
+            self.cache.put(key, results)
+        return results
 
-        if not self.use_reranker:
-            return vector_results
+    async def aget_relevant_documents(self, query: str) -> list[Document]:
+        """
+        Async variant of get_relevant_documents, for the async chat path.
+        """
+        if not self.vectorstore:
+            logger.error("Vector store not initialized.")
+            return []
 
-        # Reranking logic
-        docs_to_rerank = [doc.page_content for doc in vector_results]
-        reranked_results = self.reranker.rerank(
-            query=query,
-            documents=docs_to_rerank,
-            top_k=self.rerank_top_k
-        )
+        key = self.cache_key(query) if self.cache is not None else None
+        if key is not None and (cached := self.cache.get(key)) is not None:
+            return cached
+        results, complete = await self.aretrieve(query)
+        if key is not None and complete:
+            self.cache.put(key, results)
+        return results
+
+    def retrieve(self, query: str) -> tuple[list[Document], bool]:
+        """
+        Runs the search and the reranking. Also returns whether the result is
+        complete: a ranking cut short by the reranker's latency budget is not
+        worth memoizing.
+        """
+        scored_results = self.vector_search(query)
+        candidates, results = self.select_candidates(query, scored_results)
+        if results is not None:
+            return results, True
 
-        reranked_docs = []
-        for r in reranked_results:
-            for doc in vector_results:
-                if doc.page_content == r.text:
-                    reranked_docs.append(doc)
-                    break
-        return reranked_docs
+        try:
+            reranked_results = self.reranker.rerank(query=query, **self.rerank_arguments(candidates))
+        except requests.Timeout:
+            logger.warning("Reranker exceeded its latency budget. Keeping the vector search order.")
+            return candidates[:self.rerank_top_k], False
+        return [candidates[r.index] for r in reranked_results], True
+
+    async def aretrieve(self, query: str) -> tuple[list[Document], bool]:
+        scored_results = await self.avector_search(query)
+        candidates, results = self.select_candidates(query, scored_results)
+        if results is not None:
+            return results, True
+
+        try:
+            reranked_results = await self.reranker.arerank(query=query, **self.rerank_arguments(candidates))
+        except requests.Timeout:
+            logger.warning("Reranker exceeded its latency budget. Keeping the vector search order.")
+            return candidates[:self.rerank_top_k], False
+        return [candidates[r.index] for r in reranked_results], True
+
+    def select_candidates(self, query: str, scored_results) -> tuple[list[Document], Optional[list[Document]]]:
+        """
+        Fuses the vector results with lexical matches into rerank candidates.
+        Returns the candidates, and the final results when reranking is off or
+        can be skipped.
+        """
+        vector_results = [doc for doc, _ in scored_results]
+
+        lexical_indexes = self.lexical_indexes()
+        hybrid = self.config.HYBRID_SEARCH and bool(lexical_indexes)
+        if hybrid:
+            # Lexical matches catch rare names, numbers and legal terms the
+            # embedding model misses; fused candidates share the vector_top_k budget.
+            # BM25 scores depend on each index's own statistics, so the
+            # documents' lists are fused by rank rather than merged by score
+            lexical_results = reciprocal_rank_fusion([
+                index.search(query, k=self.config.LEXICAL_TOP_K) for index in lexical_indexes
+            ], k=self.config.RRF_K)[:self.config.LEXICAL_TOP_K]
+            vector_results = reciprocal_rank_fusion(
+                [vector_results, lexical_results], k=self.config.RRF_K
+            )[:self.vector_top_k]
+
+        if not self.use_reranker or not vector_results:
+            return vector_results, vector_results
+
+        # Vector similarity margins say nothing about lexical-only candidates
+        if self.config.RERANK_CASCADE and not hybrid and self.is_decisive([score for _, score in scored_results]):
+            logger.info("Vector similarity margin is decisive. Skipping reranking.")
+            return vector_results, vector_results[:self.rerank_top_k]
+        return vector_results, None
+
+    def rerank_arguments(self, candidates: list[Document]) -> dict:
+        cascade = self.config.RERANK_CASCADE
+        return {
+            "documents": [doc.page_content for doc in candidates],
+            "top_k": self.rerank_top_k,
+            "prescore_max_tokens": self.config.RERANK_PRESCORE_TOKENS if cascade else None,
+            "uncertain_window": self.config.RERANK_UNCERTAIN_WINDOW,
+            "latency_budget_ms": self.config.RERANK_LATENCY_BUDGET_MS if cascade else None
+        }
+
+    def is_decisive(self, scores: list[float]) -> bool:
+        """
+        Checks whether the vector similarities already separate the top
+        rerank_top_k results from the rest by at least the configured margin.
+        """
+        k = self.rerank_top_k
+        if len(scores) <= k:
+            return False
+        return scores[k - 1] - scores[k] >= self.config.RERANK_SKIP_MARGIN
 
     def invoke(self, query: str) -> str:
         """
         Retrieves relevant documents and returns their concatenated content.
         """
         docs = self.get_relevant_documents(query)
+        return "\n\n".join(doc.page_content for doc in docs)
+
+    async def ainvoke(self, query: str) -> str:
+        docs = await self.aget_relevant_documents(query)
         return "\n\n".join(doc.page_content for doc in docs)
\ No newline at end of file
@@ -0,0 +1,65 @@
+import re
+import unicodedata
+from typing import List, Optional
+import fitz
+
+ARABIC_LETTER = re.compile("[\u0621-\u064a\u0671-\u06d3]")
+# Glyph-level codepoints: extracted text that keeps them was never reshaped to logical letters
+PRESENTATION_FORM = re.compile("[\ufb50-\ufdff\ufe70-\ufefc]")
+ARABIC_WORD = re.compile("[\u0621-\u064a]{2,}")
+# Letters that only occur word-finally; a word starting with one was most likely stored reversed
+FINAL_ONLY = "\u0629\u0649"  # ta marbuta, alef maqsura
+# The definite article, alone or after a one-letter prefix
+ARTICLE_PREFIXES = ("ال", "وال", "بال", "فال", "كال", "لل")
+
+
+def native_page_texts(pdf_path: str) -> List[str]:
+    """
+    Returns the text layer of every page, in reading order.
+    """
+    with fitz.open(pdf_path) as doc:
+        return [page.get_text("text", sort=True) for page in doc]
+
+
+def text_layer_problem(
+    text: str,
+    min_chars: int = 50,
+    min_arabic_ratio: float = 0.3,
+    max_presentation_ratio: float = 0.1,
+    max_reversed_ratio: float = 0.05,
+) -> Optional[str]:
+    """
+    Checks whether a page's native text can replace OCR. Returns None when it
+    can, otherwise a short reason: too little text, too few Arabic letters,
+    unshaped presentation forms, or words in visual (reversed) order.
+    """
+    text = unicodedata.normalize("NFC", text)
+    visible = [c for c in text if not c.isspace()]
+    if len(visible) < min_chars:
+        return "too_short"
+    if "\ufffd" in text:
+        return "undecodable"
+
+    letters = sum(1 for c in visible if c.isalpha())
+    presentation = len(PRESENTATION_FORM.findall(text))
+    arabic = len(ARABIC_LETTER.findall(text)) + presentation
+    if not letters or arabic / letters < min_arabic_ratio:
+        return "low_arabic_ratio"
+    if arabic and presentation / arabic > max_presentation_ratio:
+        return "presentation_forms"
+
+    words = ARABIC_WORD.findall(text)
+    if not words:
+        return None
+    final_initial = sum(1 for word in words if word[0] in FINAL_ONLY)
+    # Reversed, the article ال becomes a final لا. Prose has plenty of words
+    # like لا, إلا, مثلا or قليلا too, so this only counts when such endings
+    # outnumber the article itself; short function words are never reversed
+    # article words, which need a stem of two letters or more.
+    article = sum(1 for word in words if word.startswith(ARTICLE_PREFIXES))
+    reversed_article = sum(1 for word in words if len(word) >= 4 and word.endswith("لا"))
+    if final_initial / len(words) > max_reversed_ratio:
+        return "reversed_order"
+    if reversed_article > article and reversed_article / len(words) > max_reversed_ratio:
+        return "reversed_order"
+    return None
@@ -0,0 +1,740 @@
+import heapq
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_pinecone import PineconeVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def matches_filter(metadata: dict, filter: Optional[dict]) -> bool:
+    """
+    Evaluates a Pinecone-style metadata filter: plain values mean equality,
+    and {"$eq", "$ne", "$in", "$nin"} operators are supported.
+    """
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+    return True
+
+
+class HNSWGraph:
+    """
+    Hierarchical navigable small-world graph over the rows of a vector matrix.
+    Vectors are expected to be L2-normalized, so similarity is a dot product.
+    """
+    def __init__(self, m: int = 16, ef_construction: int = 100, seed: int = 42):
+        self.m = m
+        self.max_m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.level_mult = 1 / math.log(m)
+        self.rng = random.Random(seed)
+        self.links: List[List[List[int]]] = []
+        self.entry_point: Optional[int] = None
+        self.max_level = -1
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    def _search_layer(self, vectors: np.ndarray, query: np.ndarray, entry_points: List[int], ef: int, level: int) -> List[Tuple[float, int]]:
+        visited = set(entry_points)
+        sims = (vectors[entry_points] @ query).tolist()
+        candidates = [(-sim, node) for sim, node in zip(sims, entry_points)]
+        results = [(sim, node) for sim, node in zip(sims, entry_points)]
+        heapq.heapify(candidates)
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+            neighbors = [n for n in self.links[node][level] if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for sim, neighbor in zip((vectors[neighbors] @ query).tolist(), neighbors):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbor))
+                    heapq.heappush(results, (sim, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return results
+
+    def _select_neighbors(self, vectors: np.ndarray, candidates: List[Tuple[float, int]], m: int) -> List[int]:
+        """
+        Keeps a candidate only if it is closer to the base node than to every
+        neighbor already kept, which spreads links across directions.
+        """
+        candidates = sorted(candidates, reverse=True)
+        nodes = [node for _, node in candidates]
+        pairwise = vectors[nodes] @ vectors[nodes].T
+        selected = []
+        pruned = []
+        for i, (sim, node) in enumerate(candidates):
+            if len(selected) >= m:
+                break
+            if not selected or float(pairwise[i, selected].max()) < sim:
+                selected.append(i)
+            else:
+                pruned.append(i)
+        selected = [nodes[i] for i in selected]
+        pruned = [nodes[i] for i in pruned]
+        return selected + pruned[:m - len(selected)]
+
+    def add(self, node: int, vectors: np.ndarray):
+        """
+        Links row `node` of `vectors` into the graph. Rows must be added in order.
+        """
+        level = int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+        self.links.append([[] for _ in range(level + 1)])
+        if self.entry_point is None:
+            self.entry_point, self.max_level = node, level
+            return
+
+        query = vectors[node]
+        entry = [self.entry_point]
+        for lvl in range(self.max_level, level, -1):
+            entry = [max(self._search_layer(vectors, query, entry, 1, lvl))[1]]
+
+        for lvl in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(vectors, query, entry, self.ef_construction, lvl)
+            max_m = self.max_m0 if lvl == 0 else self.m
+            self.links[node][lvl] = self._select_neighbors(vectors, found, self.m)
+            for neighbor in self.links[node][lvl]:
+                links = self.links[neighbor][lvl]
+                links.append(node)
+                if len(links) > max_m:
+                    sims = (vectors[links] @ vectors[neighbor]).tolist()
+                    self.links[neighbor][lvl] = self._select_neighbors(vectors, list(zip(sims, links)), max_m)
+            entry = [n for _, n in found]
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, ef: int) -> List[Tuple[float, int]]:
+        """
+        Returns up to `ef` (similarity, row) pairs, best first.
+        """
+        if self.entry_point is None:
+            return []
+        entry = [self.entry_point]
+        for lvl in range(self.max_level, 0, -1):
+            entry = [max(self._search_layer(vectors, query, entry, 1, lvl))[1]]
+        return sorted(self._search_layer(vectors, query, entry, ef, 0), reverse=True)
+
+    def to_dict(self) -> dict:
+        return {"entry_point": self.entry_point, "max_level": self.max_level, "links": self.links}
+
+    def load_dict(self, data: dict):
+        self.entry_point = data["entry_point"]
+        self.max_level = data["max_level"]
+        self.links = data["links"]
+
+
+class NamespaceIndex:
+    """
+    Vectors and payloads of one namespace.
+
+    Normalized float32 vectors live in a memory-mapped file that grows by
+    doubling; ids, texts and metadata are kept in an append-only JSON lines log
+    that is replayed on load. Deleted rows are tombstoned.
+
+    The HNSW graph is written out whenever it has grown by as many rows as it
+    had at its last save, and on `flush()`; rows missing from the saved graph
+    are linked in again on load. Live rows are also indexed by their
+    "document" metadata, which most filters select on.
+    """
+    def __init__(self, path: str, mode: str = "exact", hnsw_m: int = 16, ef_construction: int = 100, ef_search: int = 64):
+        self.path = path
+        self.mode = mode
+        self.ef_search = ef_search
+        self.dim = None
+        self.rows = 0
+        self.capacity = 0
+        self.vectors = None
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.row_by_id: Dict[str, int] = {}
+        self.rows_by_document: Dict[Any, set] = {}
+        self.graph = HNSWGraph(m=hnsw_m, ef_construction=ef_construction) if mode == "hnsw" else None
+        self.graph_saved_rows = 0
+        self.lock = threading.RLock()
+        self._load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.path, "records.jsonl")
+
+    @property
+    def _graph_path(self) -> str:
+        return os.path.join(self.path, "graph.json")
+
+    def __len__(self) -> int:
+        return len(self.row_by_id)
+
+    def _open_vectors(self, capacity: int):
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.capacity = capacity
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive[:capacity]
+        self.alive = alive
+
+    def _ensure_capacity(self, extra: int):
+        if self.rows + extra <= self.capacity:
+            return
+        capacity = max(1024, 2 * self.capacity, self.rows + extra)
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._open_vectors(capacity)
+
+    def _load(self):
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["op"] == "init":
+                    self.dim = record["dim"]
+                elif record["op"] == "add":
+                    self._add_record(record["id"], record["text"], record["metadata"])
+                elif record["op"] == "delete":
+                    self._delete_row(record["row"])
+                elif record["op"] == "update":
+                    self._set_metadata(self.row_by_id[record["id"]], record["metadata"])
+        self._open_vectors(os.path.getsize(self._vectors_path) // (4 * self.dim))
+        self.alive[:self.rows] = False
+        for row in self.row_by_id.values():
+            self.alive[row] = True
+
+        if self.graph is not None:
+            if os.path.exists(self._graph_path):
+                with open(self._graph_path) as f:
+                    self.graph.load_dict(json.load(f))
+            self.graph_saved_rows = len(self.graph)
+            for row in range(len(self.graph), self.rows):
+                self.graph.add(row, self.vectors)
+
+    def _add_record(self, record_id: str, text: str, metadata: dict):
+        if record_id in self.row_by_id:
+            self._delete_row(self.row_by_id[record_id])
+        self.ids.append(record_id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self.row_by_id[record_id] = self.rows
+        self.rows_by_document.setdefault(metadata.get("document"), set()).add(self.rows)
+        self.rows += 1
+
+    def _delete_row(self, row: int):
+        if self.row_by_id.get(self.ids[row]) == row:
+            del self.row_by_id[self.ids[row]]
+            document = self.metadatas[row].get("document")
+            rows = self.rows_by_document[document]
+            rows.discard(row)
+            if not rows:
+                del self.rows_by_document[document]
+        if row < len(self.alive):
+            self.alive[row] = False
+
+    def _set_metadata(self, row: int, metadata: dict):
+        document = self.metadatas[row].get("document")
+        if metadata.get("document") != document:
+            self.rows_by_document[document].discard(row)
+            if not self.rows_by_document[document]:
+                del self.rows_by_document[document]
+            self.rows_by_document.setdefault(metadata.get("document"), set()).add(row)
+        self.metadatas[row] = metadata
+
+    def update_metadata(self, ids: Sequence[str], metadatas: Sequence[dict]) -> int:
+        """
+        Replaces the metadata of stored records, keeping their vectors and
+        texts. Returns how many records actually changed.
+        """
+        with self.lock:
+            log = []
+            for record_id, metadata in zip(ids, metadatas):
+                row = self.row_by_id.get(record_id)
+                if row is not None and self.metadatas[row] != metadata:
+                    self._set_metadata(row, metadata)
+                    log.append({"op": "update", "id": record_id, "metadata": metadata})
+            self._append_log(log)
+            return len(log)
+
+    def _append_log(self, records: List[dict]):
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _save_graph(self):
+        tmp_path = self._graph_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.graph.to_dict(), f)
+        os.replace(tmp_path, self._graph_path)
+        self.graph_saved_rows = len(self.graph)
+
+    def flush(self):
+        """
+        Persists the rows added to the HNSW graph since it was last saved.
+        """
+        with self.lock:
+            if self.graph is not None and len(self.graph) > self.graph_saved_rows:
+                self._save_graph()
+
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, texts: Sequence[str], metadatas: Sequence[dict]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(ids):
+            return
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        with self.lock:
+            if self.dim is None:
+                os.makedirs(self.path, exist_ok=True)
+                self.dim = vectors.shape[1]
+                self._append_log([{"op": "init", "dim": self.dim}])
+            self._ensure_capacity(len(ids))
+
+            first_row = self.rows
+            log = []
+            for record_id, text, metadata in zip(ids, texts, metadatas):
+                if record_id in self.row_by_id:
+                    log.append({"op": "delete", "row": self.row_by_id[record_id]})
+                self._add_record(record_id, text, metadata)
+                log.append({"op": "add", "id": record_id, "text": text, "metadata": metadata})
+
+            self.vectors[first_row:self.rows] = vectors
+            self.vectors.flush()
+            # An id repeated within the batch leaves only its last row live
+            self.alive[first_row:self.rows] = [
+                self.row_by_id.get(self.ids[row]) == row for row in range(first_row, self.rows)
+            ]
+            self._append_log(log)
+
+            if self.graph is not None:
+                for row in range(first_row, self.rows):
+                    self.graph.add(row, self.vectors)
+                # Saving rewrites the whole graph, so saves are spaced geometrically
+                if self.rows - self.graph_saved_rows >= max(1024, self.graph_saved_rows):
+                    self._save_graph()
+
+    def delete(self, ids: Optional[Iterable[str]] = None, filter: Optional[dict] = None) -> int:
+        with self.lock:
+            if ids is not None:
+                rows = [self.row_by_id[i] for i in ids if i in self.row_by_id]
+            else:
+                rows = np.flatnonzero(self._allowed_rows(filter)).tolist()
+            for row in rows:
+                self._delete_row(row)
+            self._append_log([{"op": "delete", "row": row} for row in rows])
+            return len(rows)
+
+    def _document_rows(self, condition: Any) -> Optional[set]:
+        """
+        Rows whose "document" satisfies an equality or membership condition,
+        or None when the condition cannot be answered from the index.
+        """
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        if not condition or set(condition) - {"$eq", "$in"}:
+            return None
+        rows = None
+        if "$eq" in condition:
+            rows = set(self.rows_by_document.get(condition["$eq"], ()))
+        if "$in" in condition:
+            members = set().union(*(self.rows_by_document.get(value, ()) for value in condition["$in"]))
+            rows = members if rows is None else rows & members
+        return rows
+
+    def _allowed_rows(self, filter: Optional[dict]) -> np.ndarray:
+        allowed = self.alive[:self.rows].copy()
+        if not filter:
+            return allowed
+        rows = self._document_rows(filter["document"]) if "document" in filter else None
+        if rows is not None:
+            selected = np.zeros_like(allowed)
+            selected[list(rows)] = True
+            allowed &= selected
+            filter = {key: condition for key, condition in filter.items() if key != "document"}
+        if filter:
+            for row in np.flatnonzero(allowed):
+                allowed[row] = matches_filter(self.metadatas[row], filter)
+        return allowed
+
+    def search(self, query: np.ndarray, k: int, filter: Optional[dict] = None) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (row, cosine similarity) pairs, best first.
+        """
+        with self.lock:
+            if not self.row_by_id:
+                return []
+            query = np.asarray(query, dtype=np.float32)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+            allowed = self._allowed_rows(filter)
+            allowed_count = int(allowed.sum())
+            if allowed_count == 0:
+                return []
+
+            if self.graph is not None and allowed_count > 4 * self.ef_search:
+                # Widen the beam in proportion to how much of the index the filter excludes
+                ef = min(self.rows, max(self.ef_search, k) * math.ceil(self.rows / allowed_count))
+                hits = [(row, sim) for sim, row in self.graph.search(self.vectors, query, ef) if allowed[row]]
+                if len(hits) >= min(k, allowed_count):
+                    return hits[:k]
+
+            sims = np.asarray(self.vectors[:self.rows] @ query)
+            sims[~allowed] = -np.inf
+            k = min(k, allowed_count)
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            return [(int(row), float(sims[row])) for row in top]
+
+    def drop(self):
+        with self.lock:
+            self.vectors = None
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+_open_indexes: Dict[str, NamespaceIndex] = {}
+_open_indexes_lock = threading.Lock()
+
+def open_namespace(root_dir: str, namespace: str, mode: str, **hnsw_kwargs) -> NamespaceIndex:
+    """
+    Returns the process-wide index of a namespace, so every session sees the same data.
+    """
+    path = os.path.join(root_dir, namespace)
+    with _open_indexes_lock:
+        if path not in _open_indexes:
+            _open_indexes[path] = NamespaceIndex(path, mode=mode, **hnsw_kwargs)
+        return _open_indexes[path]
+
+def close_namespace(root_dir: str, namespace: str):
+    with _open_indexes_lock:
+        index = _open_indexes.pop(os.path.join(root_dir, namespace), None)
+    if index is not None:
+        index.drop()
+    else:
+        shutil.rmtree(os.path.join(root_dir, namespace), ignore_errors=True)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process, namespaced vector store with the same LangChain interface as
+    PineconeVectorStore. Search is exact (one NumPy matrix product) or runs
+    over an HNSW graph when `mode="hnsw"`; indexes persist under `root_dir`.
+    Scores are cosine similarities, higher is better, as with Pinecone.
+    """
+    _text_key = "text"
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        root_dir: str,
+        namespace: str = "default",
+        mode: str = "exact",
+        hnsw_m: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 64
+    ):
+        self._embedding = embedding
+        self.root_dir = root_dir
+        self._namespace = namespace
+        self.mode = mode
+        self.hnsw_kwargs = {"hnsw_m": hnsw_m, "ef_construction": ef_construction, "ef_search": ef_search}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _namespace_index(self, namespace: Optional[str] = None) -> NamespaceIndex:
+        return open_namespace(self.root_dir, namespace or self._namespace, self.mode, **self.hnsw_kwargs)
+
+    def upsert_embeddings(
+        self,
+        ids: Sequence[str],
+        vectors: Any,
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[dict]] = None,
+        namespace: Optional[str] = None
+    ) -> List[str]:
+        """
+        Stores precomputed vectors without calling the embedding model.
+        """
+        metadatas = metadatas or [{} for _ in texts]
+        self._namespace_index(namespace).upsert(list(ids), vectors, list(texts), [dict(m) for m in metadatas])
+        return list(ids)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        return self.upsert_embeddings(ids, vectors, texts, metadatas, namespace)
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        namespace: Optional[str] = None
+    ) -> List[Tuple[Document, float]]:
+        index = self._namespace_index(namespace)
+        return [
+            (Document(id=index.ids[row], page_content=index.texts[row], metadata=dict(index.metadatas[row])), score)
+            for row, score in index.search(np.asarray(embedding, dtype=np.float32), k, filter)
+        ]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter, namespace)
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter, namespace)]
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        namespace: Optional[str] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, namespace)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    def flush(self, namespace: Optional[str] = None):
+        self._namespace_index(namespace).flush()
+
+    def get_by_ids(self, ids: Sequence[str], namespace: Optional[str] = None) -> List[Document]:
+        index = self._namespace_index(namespace)
+        return [
+            Document(id=i, page_content=index.texts[index.row_by_id[i]], metadata=dict(index.metadatas[index.row_by_id[i]]))
+            for i in ids if i in index.row_by_id
+        ]
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        delete_all: Optional[bool] = None,
+        namespace: Optional[str] = None,
+        filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> Optional[bool]:
+        if delete_all:
+            close_namespace(self.root_dir, namespace or self._namespace)
+        elif ids is not None or filter is not None:
+            self._namespace_index(namespace).delete(ids=ids, filter=filter)
+        return True
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        root_dir: str = "local_index",
+        namespace: str = "default",
+        **kwargs: Any
+    ) -> "LocalVectorStore":
+        store = cls(embedding, root_dir, namespace=namespace, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+def create_vectorstore(config, embedding: Embeddings, namespace: str) -> VectorStore:
+    """
+    Builds the vector store selected by `config.VECTOR_STORE` ("pinecone" or "local").
+    """
+    if config.VECTOR_STORE == "local":
+        return LocalVectorStore(
+            embedding,
+            config.LOCAL_INDEX_DIR,
+            namespace=namespace,
+            mode=config.LOCAL_INDEX_MODE,
+            hnsw_m=config.HNSW_M,
+            ef_construction=config.HNSW_EF_CONSTRUCTION,
+            ef_search=config.HNSW_EF_SEARCH
+        )
+    return PineconeVectorStore(
+        index_name=config.PINECONE_INDEX_NAME,
+        embedding=embedding,
+        namespace=namespace,
+        pinecone_api_key=config.PINECONE_API_KEY
+    )
+
+def upsert_vectors(
+    vectorstore: VectorStore,
+    ids: List[str],
+    vectors: Sequence[Any],
+    texts: List[str],
+    metadatas: List[dict],
+    namespace: str
+):
+    """
+    Writes precomputed vectors to either store, bypassing its embedding model.
+    """
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.upsert_embeddings(ids, np.asarray(vectors, dtype=np.float32), texts, metadatas, namespace)
+        return
+    vectorstore._index.upsert(
+        vectors=[
+            {"id": i, "values": np.asarray(vector, dtype=np.float32).tolist(), "metadata": {**metadata, vectorstore._text_key: text}}
+            for i, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+        ],
+        namespace=namespace
+    )
+
+def flush_vectors(vectorstore: VectorStore, namespace: str):
+    """
+    Persists whatever a local index still buffers; Pinecone writes are durable already.
+    """
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.flush(namespace)
+
+def update_metadata(vectorstore: VectorStore, ids: Sequence[str], metadatas: Sequence[dict], namespace: str) -> int:
+    """
+    Rewrites the metadata of stored chunks where it changed, without
+    embedding them again. Returns the number of chunks updated.
+    """
+    if isinstance(vectorstore, LocalVectorStore):
+        return vectorstore._namespace_index(namespace).update_metadata(list(ids), [dict(m) for m in metadatas])
+    stored = {doc.id: doc.metadata for doc in fetch_documents_by_ids(vectorstore, ids, namespace)}
+    updated = 0
+    for i, metadata in zip(ids, metadatas):
+        if i in stored and stored[i] != metadata:
+            vectorstore._index.update(id=i, set_metadata=dict(metadata), namespace=namespace)
+            updated += 1
+    return updated
+
+def list_vector_ids(vectorstore: VectorStore, prefix: str, namespace: str) -> List[str]:
+    """
+    Returns the ids stored in a namespace that start with `prefix`. Pinecone
+    can only list ids on serverless indexes; elsewhere nothing is returned and
+    callers fall back to indexing everything.
+    """
+    if isinstance(vectorstore, LocalVectorStore):
+        index = vectorstore._namespace_index(namespace)
+        with index.lock:
+            return [i for i in index.row_by_id if i.startswith(prefix)]
+    try:
+        return [i for page in vectorstore._index.list(prefix=prefix, namespace=namespace) for i in page]
+    except Exception as e:
+        logger.warning(f"Could not list existing vector ids: {e}")
+        return []
+
+def delete_vectors(vectorstore: VectorStore, ids: Sequence[str], namespace: str, batch_size: int = 1000):
+    """
+    Deletes vectors by id from either store.
+    """
+    ids = list(ids)
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.delete(ids=ids, namespace=namespace)
+        return
+    for start in range(0, len(ids), batch_size):
+        vectorstore._index.delete(ids=ids[start:start + batch_size], namespace=namespace)
+
+def fetch_documents(vectorstore: VectorStore, namespace: str, batch_size: int = 100) -> List[Document]:
+    """
+    Reads back every chunk stored in a namespace, e.g. to rebuild its lexical index.
+    """
+    if isinstance(vectorstore, LocalVectorStore):
+        index = vectorstore._namespace_index(namespace)
+        with index.lock:
+            return [
+                Document(id=i, page_content=index.texts[row], metadata=dict(index.metadatas[row]))
+                for i, row in index.row_by_id.items()
+            ]
+    return fetch_documents_by_ids(vectorstore, list_vector_ids(vectorstore, "", namespace), namespace, batch_size)
+
+def fetch_documents_by_ids(vectorstore: VectorStore, ids: Sequence[str], namespace: str, batch_size: int = 100) -> List[Document]:
+    """
+    Reads back the given chunks of a namespace; ids it does not hold are skipped.
+    """
+    ids = list(ids)
+    if isinstance(vectorstore, LocalVectorStore):
+        return vectorstore.get_by_ids(ids, namespace=namespace)
+    documents = []
+    for start in range(0, len(ids), batch_size):
+        fetched = vectorstore._index.fetch(ids=ids[start:start + batch_size], namespace=namespace)
+        for i, vector in fetched.vectors.items():
+            metadata = dict(vector.metadata or {})
+            documents.append(Document(id=i, page_content=metadata.pop(vectorstore._text_key, ""), metadata=metadata))
+    return documents
+
+def delete_namespace(vectorstore: VectorStore, namespace: str):
+    """
+    Drops a whole namespace from either store.
+    """
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.delete(delete_all=True, namespace=namespace)
+        return
+    vectorstore._index.delete(delete_all=True, namespace=namespace)
+
+def delete_document_vectors(vectorstore: VectorStore, document_key: str, namespace: str):
+    """
+    Deletes the chunks of one document from a namespace it shares with other
+    documents. Chunks carry the document key in their metadata and id prefix.
+    """
+    if isinstance(vectorstore, LocalVectorStore):
+        vectorstore.delete(filter={"document": document_key}, namespace=namespace)
+        return
+    ids = list_vector_ids(vectorstore, f"{document_key}#", namespace)
+    if ids:
+        delete_vectors(vectorstore, ids, namespace)
+        return
+    try:
+        # Pod-based indexes cannot list ids but can delete by metadata
+        vectorstore._index.delete(filter={"document": document_key}, namespace=namespace)
+    except Exception as e:
+        logger.warning(f"Could not delete the vectors of document {document_key}: {e}")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The app imports its packages relative to web_service/, as Streamlit runs it,
+# and the modules it shares with the model services from the repo root
+WEB_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(WEB_SERVICE_DIR))
+sys.path.insert(0, WEB_SERVICE_DIR)
@@ -0,0 +1,28 @@
+import numpy as np
+from core.answer_cache import AnswerCache
+
+EMBEDDING = np.ones(8, dtype=np.float32)
+
+
+def test_similar_question_hits_with_its_context():
+    cache = AnswerCache(threshold=0.97)
+    cache.store("corpus", 1, "ما هي المادة 5؟", EMBEDDING, "answer", ["doc#a", "doc#b"])
+    cached, similarity = cache.lookup("corpus", 1, "ما هى المادة 5", EMBEDDING)
+    assert cached.answer == "answer"
+    assert cached.chunk_ids == ["doc#a", "doc#b"]
+    assert similarity > 0.99
+
+
+def test_questions_about_other_numbers_miss():
+    cache = AnswerCache(threshold=0.97)
+    cache.store("corpus", 1, "ما هي المادة 5؟", EMBEDDING, "answer", ["doc#a"])
+    assert cache.lookup("corpus", 1, "ما هي المادة 6؟", EMBEDDING) is None
+    # Arabic-Indic digits name the same number
+    assert cache.lookup("corpus", 1, "ما هي المادة ٥؟", EMBEDDING) is not None
+
+
+def test_new_corpus_version_empties_the_partition():
+    cache = AnswerCache()
+    cache.store("corpus", 1, "سؤال", EMBEDDING, "answer", [])
+    assert cache.lookup("corpus", 2, "سؤال", EMBEDDING) is None
+    assert cache.lookup("corpus", 1, "سؤال", EMBEDDING) is None
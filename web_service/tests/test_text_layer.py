@@ -0,0 +1,36 @@
+import pytest
+from core.text_layer import text_layer_problem
+
+# Native text layers of the kind uploaded in practice: administrative,
+# legal and narrative prose, full of words ending in "لا".
+NATIVE_SAMPLES = [
+    "قال المدير لا يمكن تأجيل الاجتماع مثلا إلى الغد ولا بعده، فالعمل أولا ثم الراحة، "
+    "وليس هناك سبب يدعو إلى ذلك إلا إذا طلب الموظفون ذلك فعلا.",
+    "المادة الأولى: يعمل بأحكام هذا القانون اعتبارا من تاريخ نشره في الجريدة الرسمية، "
+    "ولا يجوز تعديل أي حكم من أحكامه إلا بقانون، ويلغى كل نص يخالفه أصلا أو فرعا.",
+    "قرر مجلس الإدارة في جلسته المنعقدة يوم الأحد تعيين رئيس جديد للجنة المالية، "
+    "على أن يقدم تقريرا مفصلا عن الميزانية خلال شهر، وألا يتجاوز الإنفاق الحد المقرر سلفا.",
+    "كان الطريق طويلا والليل قليلا ما يهدأ، فلا صوت إلا صوت الريح، "
+    "ومشى الرجل في المدينة القديمة متأملا البيوت والأسواق التي عرفها طفلا.",
+]
+
+
+@pytest.mark.parametrize("text", NATIVE_SAMPLES)
+def test_native_prose_is_accepted(text):
+    assert text_layer_problem(text) is None
+
+
+@pytest.mark.parametrize("text", NATIVE_SAMPLES)
+def test_visual_order_text_is_rejected(text):
+    # Text layers stored in visual order read right to left character by character
+    reversed_lines = text[::-1]
+    assert text_layer_problem(reversed_lines) == "reversed_order"
+
+
+def test_presentation_forms_are_rejected():
+    text = "ﻟﺎﻣﺎﺩﺓ " * 20
+    assert text_layer_problem(text) == "presentation_forms"
+
+
+def test_short_text_is_rejected():
+    assert text_layer_problem("صفحة") == "too_short"
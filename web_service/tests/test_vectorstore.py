@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from core.vectorstore import LocalVectorStore
+
+
+@pytest.mark.parametrize("mode", ["exact", "hnsw"])
+def test_repeated_id_in_one_batch_keeps_the_last_record(tmp_path, mode):
+    store = LocalVectorStore(None, str(tmp_path), namespace=f"dup-{mode}", mode=mode)
+    store.upsert_embeddings(["dup", "dup", "other"], np.eye(3, 4), ["a", "b", "c"], [{"document": "d"}] * 3)
+    texts = [doc.page_content for doc, _ in store.similarity_search_by_vector_with_score([1, 0, 0, 0], k=5)]
+    assert sorted(texts) == ["b", "c"]
+
+
+def test_document_filter_and_delete(tmp_path):
+    store = LocalVectorStore(None, str(tmp_path), namespace="docs")
+    store.upsert_embeddings(
+        ["a#1", "a#2", "b#1"], np.eye(3, 4), ["a1", "a2", "b1"],
+        [{"document": "a"}, {"document": "a"}, {"document": "b"}]
+    )
+    hits = store.similarity_search_by_vector([0, 0, 1, 0], k=5, filter={"document": "a"})
+    assert sorted(doc.page_content for doc in hits) == ["a1", "a2"]
+
+    store.delete(filter={"document": {"$in": ["a"]}})
+    assert [doc.page_content for doc in store.similarity_search_by_vector([1, 0, 0, 0], k=5)] == ["b1"]
@@ -15,4 +15,53 @@ class AppConfig:
         self.ZYLA_OCR_API_URL = "https://zylalabs.com/api/37/optical+character+recognition+api/108/image+analysis"
         self.CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
         self.CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
-        self.CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
\ No newline at end of file
+        self.CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
+        self.RENDER_ZOOM = float(os.getenv("RENDER_ZOOM", "2"))
+        self.RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) or None
+        self.USE_NATIVE_TEXT = os.getenv("USE_NATIVE_TEXT", "true").lower() == "true"
+        self.NATIVE_TEXT_MIN_CHARS = int(os.getenv("NATIVE_TEXT_MIN_CHARS", "50"))
+        self.NATIVE_TEXT_MIN_ARABIC_RATIO = float(os.getenv("NATIVE_TEXT_MIN_ARABIC_RATIO", "0.3"))
+        self.OCR_PROVIDER = os.getenv("OCR_PROVIDER", "zyla")
+        self.OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "8"))
+        self.OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+        self.OCR_RETRIES = int(os.getenv("OCR_RETRIES", "2"))
+        self.OCR_BACKOFF = float(os.getenv("OCR_BACKOFF", "1.0"))
+        self.OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite")
+        self.OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "256"))
+        self.INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+        self.INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+        self.CORPUS_REGISTRY_PATH = os.getenv("CORPUS_REGISTRY_PATH", "corpus_registry.sqlite")
+        self.CORPUS_SESSION_TTL = float(os.getenv("CORPUS_SESSION_TTL", "3600"))
+        self.CORPUS_TTL = float(os.getenv("CORPUS_TTL", "86400"))
+        self.CORPUS_QUOTA_MB = int(os.getenv("CORPUS_QUOTA_MB", "1024"))
+        self.CORPUS_MAX_COUNT = int(os.getenv("CORPUS_MAX_COUNT", "500"))
+        self.CORPUS_INDEXING_TIMEOUT = float(os.getenv("CORPUS_INDEXING_TIMEOUT", "300"))
+        self.VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")
+        self.LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+        self.LOCAL_INDEX_MODE = os.getenv("LOCAL_INDEX_MODE", "exact")
+        self.HNSW_M = int(os.getenv("HNSW_M", "16"))
+        self.HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+        self.HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+        self.EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "http://embedding:8000")
+        self.RERANKER_SERVICE_URL = os.getenv("RERANKER_SERVICE_URL", "http://reranker:8001")
+        self.HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+        self.HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+        self.HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+        self.HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+        self.HTTP_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "4"))
+        self.EMBEDDING_REQUEST_BATCH = int(os.getenv("EMBEDDING_REQUEST_BATCH", "64"))
+        self.EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+        self.EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or None
+        self.EMBEDDING_RESPONSE_FORMAT = os.getenv("EMBEDDING_RESPONSE_FORMAT", "float32")
+        self.RERANK_CASCADE = os.getenv("RERANK_CASCADE", "false").lower() == "true"
+        self.RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.05"))
+        self.RERANK_PRESCORE_TOKENS = int(os.getenv("RERANK_PRESCORE_TOKENS", "64"))
+        self.RERANK_UNCERTAIN_WINDOW = int(os.getenv("RERANK_UNCERTAIN_WINDOW", "2"))
+        self.RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "800"))
+        self.RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "128"))
+        self.ANSWER_CACHE = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+        self.ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+        self.ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+        self.HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+        self.LEXICAL_TOP_K = int(os.getenv("LEXICAL_TOP_K", "10"))
+        self.RRF_K = int(os.getenv("RRF_K", "60"))
\ No newline at end of file
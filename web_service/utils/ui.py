@@ -12,8 +12,8 @@ class UIManager:
         """Initializes the session state variables if they don't exist."""
         if 'chat_history' not in st.session_state:
             st.session_state.chat_history = []
-        if 'file_hash' not in st.session_state:
-            st.session_state.file_hash = None
+        if 'documents' not in st.session_state:
+            st.session_state.documents = {}
         if 'vectorstore' not in st.session_state:
             st.session_state.vectorstore = None
 
@@ -272,10 +272,88 @@ class UIManager:
     # Function to display the file upload section
     def display_file_upload_section(self):
         st.markdown('<div class="upload-container" dir="rtl">', unsafe_allow_html=True)
-        st.markdown("<h2>📤 ارفع مستندك</h2>", unsafe_allow_html=True)
-        uploaded_file = st.file_uploader("اختر ملف", type=["txt", "pdf", "png", "jpg", "jpeg"])
+        st.markdown("<h2>📤 ارفع مستنداتك</h2>", unsafe_allow_html=True)
+        uploaded_files = st.file_uploader("اختر ملفات", type=["txt", "pdf", "png", "jpg", "jpeg"], accept_multiple_files=True)
         st.markdown('</div>', unsafe_allow_html=True)
-        return uploaded_file
+        return uploaded_files
+
+    def display_documents(self, documents):
+        """
+        Lists the session's documents with their ingestion progress. Returns
+        the file hashes of the documents to search, and the one the user asked
+        to remove, if any.
+        """
+        st.markdown("<div dir='rtl'><h2>📚 المستندات</h2></div>", unsafe_allow_html=True)
+        names = {file_hash: document.name for file_hash, document in documents.items()}
+        selected = st.multiselect(
+            "البحث في المستندات",
+            options=list(names),
+            default=list(names),
+            format_func=names.get,
+            help="المستندات التي يتم البحث فيها عند الإجابة"
+        )
+
+        removed = None
+        for file_hash, document in documents.items():
+            name_column, button_column = st.columns([5, 1])
+            name_column.markdown(f"<div dir='rtl'>📄 {document.name}</div>", unsafe_allow_html=True)
+            indexing = document.job is not None and not document.job.done
+            if button_column.button("🗑️ حذف", key=f"remove_{file_hash}", disabled=indexing,
+                                    help="لا يمكن حذف مستند أثناء معالجته" if indexing else None):
+                removed = file_hash
+            self.display_ingestion_progress(document)
+        return selected, removed
+
+    def display_ingestion_progress(self, document, chunks_per_page: int = 20):
+        """
+        Shows the progress of a document's background ingestion, refreshing
+        every second until it finishes, then the resulting chunks, a page at a
+        time, read from the document's lexical index.
+        """
+        job = document.job
+        if job is None:
+            return
+        polling = not job.done
+
+        @st.fragment(run_every=1 if polling else None)
+        def progress():
+            if polling and job.done:
+                # A fragment's refresh interval is fixed; rerun the whole app
+                # to stop polling and enable the controls waiting for the job
+                st.rerun()
+            if job.error:
+                st.error(f"Failed to process the document: {job.error}")
+                return
+            if not job.done:
+                st.progress(job.progress, text=(
+                    f"⏳ جارٍ معالجة المستند: {job.pages_done}/{job.pages_total or '?'} صفحة، "
+                    f"{job.chunks_indexed}/{job.chunks_total} قطعة مفهرسة. يمكنك طرح الأسئلة الآن."
+                ))
+                return
+
+            st.markdown(f"""
+                <div class="success-box" dir="rtl">
+                    <strong>✅ تم تحميل المستند ومعالجته بنجاح!</strong> ({job.elapsed:.1f} ث)
+                </div>
+            """, unsafe_allow_html=True)
+
+            with st.expander("📚 عرض قطع المستند"):
+                pages = max(1, -(-len(document.lexical_index) // chunks_per_page))
+                page = st.number_input("الصفحة", min_value=1, max_value=pages, value=1,
+                                       key=f"chunks_page_{document.file_hash}") if pages > 1 else 1
+                offset = (page - 1) * chunks_per_page
+                chunks = document.lexical_index.chunks_in_reading_order(offset, chunks_per_page)
+                for i, chunk in enumerate(chunks, start=offset):
+                    st.markdown(f"""
+                        <div style="padding: 1rem; background-color: var(--background-color); border-radius: 5px; margin-bottom: 1rem; text-align: right;" dir="rtl">
+                            <strong>🔹 القطعة {i+1}</strong> ({len(chunk.page_content)} حرف)<br>
+                            <div style="margin-top: 0.5rem; padding: 1rem; background-color: #FFFFFF; border-radius: 5px;">
+                                {chunk.page_content}
+                            </div>
+                        </div>
+                    """, unsafe_allow_html=True)
+
+        progress()
 
     def display_chat_interface(self):
         """Displays the chat interface, including the chat history and input field."""
@@ -318,16 +396,20 @@ class UIManager:
         for message in chat_history:
             self.display_chat_message(message)
 
-    def display_relevant_context(self, retriever, question, use_reranker):
+    def display_relevant_context(self, retriever, message, use_reranker):
         """
-        Retrieves and displays the relevant context from the vector store based on the user's question.
+        Displays the context chunks an answer was generated from, read back by
+        id, or retrieves context for messages that did not record it.
         """
         with st.expander("🔎 عرض السياق ذي الصلة"):
-            relevant_docs = retriever.get_relevant_documents(question)
+            if message.get('context_ids') is not None:
+                relevant_docs = retriever.get_documents_by_ids(message['context_ids'])
+            else:
+                relevant_docs = retriever.get_relevant_documents(message['content'])
             for idx, doc in enumerate(relevant_docs, 1):
                 st.markdown(f"""
                     <div style="padding: 1rem; background-color: var(--background-color); border-radius: 5px; margin-bottom: 1rem; text-align: right;" dir="rtl">
-                        <strong>{'🔄 معاد ترتيبه' if use_reranker else '🔍 بحث المتجهات'} النتيجة {idx}</strong>
+                        <strong>{'🔄 معاد ترتيبه' if use_reranker else '🔍 بحث المتجهات'} النتيجة {idx}</strong> ({doc.metadata.get('source', '')})
                         <div style="margin-top: 0.5rem; padding: 1rem; background-color: #FFFFFF; border-radius: 5px;">
                             {doc.page_content}
                         </div>
@@ -345,8 +427,9 @@ class UIManager:
     def reset_session_state(self):
         """Resets the session state variables and triggers a rerun of the Streamlit app."""
         st.session_state.chat_history = []
-        st.session_state.file_hash = None
+        st.session_state.documents = {}
         st.session_state.vectorstore = None
+        st.session_state.retrieval_cache = None
         st.rerun()
 
     # Custom callback handler for streaming responses
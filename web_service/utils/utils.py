@@ -33,12 +33,13 @@ def get_file_hash(file_content):
     """
     return hashlib.md5(file_content).hexdigest()
 
-def upload_image_to_fileio(file_path):
+def upload_image_to_fileio(file_path, timeout=None):
     """
-    Uploads an image to Cloudinary and returns a URL to access the image.
+    Uploads an image (a path or a file-like object) to Cloudinary and returns
+    a URL to access the image. `timeout` bounds the request, in seconds.
     """
     try:
-        upload_result = cloudinary.uploader.upload(file_path)
+        upload_result = cloudinary.uploader.upload(file_path, timeout=timeout)
         image_url = upload_result.get("secure_url")
         if image_url:
             logger.info(f"Image successfully uploaded. URL: {image_url}")
@@ -49,9 +50,11 @@ def upload_image_to_fileio(file_path):
         logger.error(f"An error occurred while uploading to Cloudinary: {e}")
         return None
 
-def extract_text_from_image_url(image_url):
+def extract_text_from_image_url(image_url, raise_errors=False, timeout=None):
     """
     Extracts and cleans text from an image URL using the Zyla OCR API.
+    Errors are logged and yield an empty string unless `raise_errors` is set.
+    `timeout` bounds the request, in seconds.
     """
     
     config = AppConfig()
@@ -64,7 +67,7 @@ def extract_text_from_image_url(image_url):
 
     try:
         # response = requests.post(api_url, headers=headers)
-        response = requests.request("GET", api_url, headers=headers) #backup_OCR
+        response = requests.request("GET", api_url, headers=headers, timeout=timeout) #backup_OCR
         response.raise_for_status()
         data = response.json()
         
@@ -77,6 +80,8 @@ def extract_text_from_image_url(image_url):
 
     except Exception as e:
         logger.error(f"An error occurred while extracting text from image URL: {e}")
+        if raise_errors:
+            raise
         return ""
 
 def generate_session_id():